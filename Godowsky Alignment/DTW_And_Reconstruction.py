@@ -7,17 +7,25 @@ from mido import Message, MidiFile, MidiTrack
 
 
 import os
+import sys
 import scipy.io as sp
 import random
 import mido
 
 from PIL import Image
 
+# the shared modules (pianoRoll.py etc.) live one directory up
+sys.path.append(os.getcwd() + '/..')
+import pianoRoll
+import frameSimilarity
+import rollDtypes
+import artifactCache
 
 
-def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1):
+
+def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1, dtypePolicy=None):
 	'''
-	Take a CSV file where row represents a note onset (note, onset_time, velocity, duration)
+	Take a CSV file (or .npy note store, see noteStore.py) where row represents a note onset (note, onset_time, velocity, duration)
 	and convert it into a matrix of size num_notes (128) x timeChunks x 2. The first element in the third
 	dimension will be duration and the second will be velocity
 
@@ -25,85 +33,17 @@ def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1):
 	If onsetOnly is false, the duration and velocity will appear in any time chunks the note is held during
 
 	Inputs
-	filepath: Filepath of the CSV file
+	filepath: Filepath of the CSV file or .npy note store
 	onsetOnly: whether to fill the matrix only at onset, or throughout its duration
 	timePerChunk: how much time each column in the matrix represents
+	dtypePolicy: dtypes of the matrix (see rollDtypes.py), None for the default policy
 
 	Output:
 	a num_notes x timeChunks x 2 (duration and velocity) matrix. 
 	'''
-	numPitches = 128;
-
-	# open your csv file
-	with open(filepath, 'r') as csvfile:
-		print("==> Reading File: %s"%(filepath))
-		myReader = csv.reader(csvfile)
-		# find the max time to figure out how big your matrix should be
-		maxTime = max([float(row[1]) for row in myReader])
-		# reset the reader
-		csvfile.seek(0)
-
-		# open it again to actually parse it, now that you know how big your matrix should be
-		curMatrix = np.zeros((numPitches, int(np.ceil(maxTime / timePerChunk)), 2))
-		
-		# read each row and add into the matrix that represents the song
-		# the csv is in the form: note, time, velocity, duration and has a row for every note onset in the song
-		numNotes = 0
-		for row in myReader:
-			numNotes = numNotes + 1
-			[note, curTime, velocity, duration] = [int(row[0]), float(row[1]), int(row[2]), float(row[3])]
-			
-			# either put an entry just for the onset, or put an entry at every point in its duration
-			if onsetOnly:
-				curMatrix[note, int(np.floor(curTime / timePerChunk)), :] = [duration, velocity]
-			else :
-				# fill in spots after the onset based on the duration
-				# any spot in the matrix it is on during gets turned on
-				curMatrix[note, int(np.floor(curTime / timePerChunk)):int(np.floor((curTime + duration) / timePerChunk)) + 1, :] = [duration, velocity]
-
-	return curMatrix
-
-'''
-Takes in boolean array, returns a row vector containing the index of the lowest
-column containing a value of "True". If there are no True values in the column, the
-value is 0.
-
-Test:
-testMat = np.array([[ True, False, False,  True],
-	   [False, False,  True, False],
-	   [False,  True, False, False]])
-
-print(testMat)
-
-print(oneDimArray(testMat))
-'''
-def generateOneDimArray(logicalMat):
-	arr = np.zeros(logicalMat.shape[1])
-
-	for col in range(logicalMat.shape[1]):
-		for row in range(logicalMat.shape[0]):
-			if logicalMat[row][col]:
-				arr[col] = row
-	return arr
-
-'''
-For a logical matrix, deletes columns where there are zeros in the given array
-
-Test:
-testMat = np.array([[ True, False, False,  True],
-	   [False, False,  True, False],
-	   [False,  True, False, False]])
-
-cols = np.array([0,3,4,0])
-
-out = deleteGivenColumns(testMat, cols)
-print(out)
-'''
-def deleteGivenColumns(logicalMat, columnsToDelete):
-	for i in range(columnsToDelete.shape[0]-1, -1, -1):
-		if columnsToDelete[i] == 0:
-			logicalMat = np.delete(logicalMat, i, 1)
-	return logicalMat
+	# with the artifact cache on, the roll is cached on disk by the contents of the file (see artifactCache.py), so only new or changed files get read
+	print("==> Reading File: %s"%(filepath))
+	return pianoRoll.loadPianoRoll(filepath, onsetOnly, timePerChunk, dtypePolicy)
 
 '''
 Calculates cosimilarity between two logical matrices. True represents
@@ -145,24 +85,12 @@ def findCosimilarityMatrix(mat1, mat2):
 	print(simRows)
 	print(simCols)
 
-	cosimilarityMat = np.empty([simRows,simCols])
-
-	for i in range(simRows):
-		A = mat2[:height, i:i+hopsize]
-		aOn = np.sum(A)
-
-		for j in range(simCols):
-			B = mat1[:height, j:j+hopsize]
-			bOn = np.sum(B)
-
-			sameOn = np.sum(np.logical_and(A,B))
-
-			similarity = (2 * sameOn) / (aOn + bOn)
-
-			cosimilarityMat[i][j] = similarity
-
+	# rows are windows of mat2, columns windows of mat1. Either can be a scipy.sparse roll.
 	# vertically flip because similarity matrices are defined stupidly
-	cosimilarityMat = np.flipud(cosimilarityMat)
+	# (cached on disk by the contents of the matrices when the artifact cache is on, see artifactCache.py)
+	params = {'hopsize': hopsize, 'dtypePolicy': rollDtypes.policyKey()}
+	cosimilarityMat = artifactCache.cachedCall('findCosimilarityMatrix', [mat1, mat2[:height]], params,
+											   lambda: np.flipud(frameSimilarity.windowedDice(mat2[:height], mat1, hopsize)))
 
 	return cosimilarityMat
 
@@ -217,7 +145,41 @@ def findCosimilarityWithPitchShifts(mat1, mat2, numPitchShifts):
 def findCosimilarityMetric(mat):
 	return np.average(mat)
 
-def costAndOnsetsToMIDI(cost, onsetOnlyOne, onsetOnlyTwo):
+# mido's default tempo (120 bpm), in microseconds per beat
+DEFAULT_TEMPO = 500000
+
+def alignCost(cost, parameter):
+	'''
+	Run DTW on a cost matrix. When the artifact cache is on it's cached on disk by the
+	contents of the cost matrix and the step parameters (see artifactCache.py)
+
+	Output:
+	accumCost, steps, path, endCol, endCost - what dtw.DTW_Cost_To_AccumCostAndSteps and dtw.DTW_GetPath give
+	'''
+	def runDTW():
+		[accumCost, steps] = dtw.DTW_Cost_To_AccumCostAndSteps(cost, parameter)
+		[path, endCol, endCost] = dtw.DTW_GetPath(accumCost, steps, parameter)
+		return (accumCost, steps, path, np.asarray(endCol), np.asarray(endCost))
+
+	params = dict((name, np.asarray(value).tolist()) for name, value in parameter.items())
+	[accumCost, steps, path, endCol, endCost] = artifactCache.cachedCall('DTW', [np.asarray(cost, dtype=np.float64)], params, runDTW)
+	return [accumCost, steps, path, endCol.item(), endCost.item()]
+
+def costAndOnsetsToMIDI(cost, onsetOnlyOne, onsetOnlyTwo, timesOne=None, timesTwo=None):
+	'''
+	Align two compacted onset matrices with DTW and write both of them to test.mid, one track
+	each, playing the frames along the path
+
+	cost: cost matrix from findCosimilarityMatrix, rows are frames of piece two upside down
+	and columns are frames of piece one
+	timesOne, timesTwo: start time in seconds of each frame of the two matrices (what
+	pianoRoll.compactFrames gives). With them every step of the path lasts as long as it
+	does in piece one, without them every step lasts 80 ticks.
+
+	Output:
+	the path in seconds - the time in piece one and in piece two of every step of the path
+	(None if the times weren't given)
+	'''
 
 	# cost = np.array([[5,9,9,9], [9,8,2,9], [9,9,5,3]], dtype=np.float64)
 
@@ -228,8 +190,10 @@ def costAndOnsetsToMIDI(cost, onsetOnlyOne, onsetOnlyTwo):
 	# create a dictionary that holds your parameters - you'll send this to the DTW function
 	parameter = {'dn': dn, 'dm': dm, 'dw': dw, 'SubSequence': subsequence}
 
-	[accumCost, steps] = dtw.DTW_Cost_To_AccumCostAndSteps(cost, parameter)
-	[path, endCol, endCost] = dtw.DTW_GetPath(accumCost, steps, parameter)
+	# flip the cost matrix right side up so the path moves forward through both pieces,
+	# then rows of the path are frames of piece two and columns are frames of piece one
+	[accumCost, steps, path, endCol, endCost] = alignCost(np.flipud(cost), parameter)
+	framesTwo, framesOne = path[0], path[1]
 
 	# drawing from arrays onsetOnlyOne and onsetOnlyTwo
 	# onsetOnlyOne = np.random.randint(2, size=(121, 100))
@@ -243,18 +207,21 @@ def costAndOnsetsToMIDI(cost, onsetOnlyOne, onsetOnlyTwo):
 	mid.tracks.append(trackOne)
 	mid.tracks.append(trackTwo)
 
-	for i in range(path.shape[1]):
-		pathRow = path[0,i]
-		pathCol = path[1,i]
+	# a step lasts until piece one gets to the next step of the path (the last one gets the default)
+	stepTicks = np.full(path.shape[1], 80, dtype=np.int64)
+	if timesOne is not None:
+		stepTicks = pianoRoll.stepTicks(np.asarray(timesOne)[framesOne], mid.ticks_per_beat, DEFAULT_TEMPO)
 
-		# grab the corresponding frames
-		frameOne = onsetOnlyOne[:, pathRow]
-		frameTwo = onsetOnlyTwo[:, pathCol]
+	for i in range(path.shape[1]):
+		frameOne = framesOne[i]
+		frameTwo = framesTwo[i]
+		delay = int(stepTicks[i])
 
+		# grab the pitches that are on in the corresponding frames (the rolls can be dense or scipy.sparse)
 		# assume the frames are the same length
 		# add a note on for any location in the frame that's true
-		onsetsOne = np.argwhere(frameOne > 0)
-		onsetsTwo = np.argwhere(frameTwo > 0)
+		onsetsOne = pianoRoll.activePitches(onsetOnlyOne, frameOne)
+		onsetsTwo = pianoRoll.activePitches(onsetOnlyTwo, frameTwo)
 		# start the notes from track one
 		print(onsetsOne)
 		for i in range(len(onsetsOne)):
@@ -271,7 +238,7 @@ def costAndOnsetsToMIDI(cost, onsetOnlyOne, onsetOnlyTwo):
 		for i in range(len(onsetsOne)):
 			if not delayDone:
 				delayDone = True
-				msg1 = Message('note_on', note=int(onsetsOne[i]), velocity=0, time=80) # delay
+				msg1 = Message('note_on', note=int(onsetsOne[i]), velocity=0, time=delay) # delay
 			else:
 				msg1 = Message('note_on', note=int(onsetsOne[i]), velocity=0, time=0)
 			trackOne.append(msg1)
@@ -281,31 +248,37 @@ def costAndOnsetsToMIDI(cost, onsetOnlyOne, onsetOnlyTwo):
 		for i in range(len(onsetsTwo)):
 			if not delayDone:
 				delayDone = True
-				msg1 = Message('note_on', note=int(onsetsTwo[i]), velocity=0, time=80) # delay
+				msg1 = Message('note_on', note=int(onsetsTwo[i]), velocity=0, time=delay) # delay
 			else:
 				msg1 = Message('note_on', note=int(onsetsTwo[i]), velocity=0, time=0)
 			trackTwo.append(msg1)
 
 	mid.save('test.mid')
 
+	if timesOne is None or timesTwo is None:
+		return None
+	return pianoRoll.pathTimes(path, timesOne, timesTwo)
+
 
 
 #midiToCSV(['Midi/'], 'CSV_From_Midi/')
-origMatrix = createMatrixFromCSV('CSV_From_Midi/chpn_op10_e01.csv', True)
+# time resolution of the rolls, the frame times of compactFrames have to use the same one
+timePerChunk = 0.1
+origMatrix = createMatrixFromCSV('CSV_From_Midi/chpn_op10_e01.csv', True, timePerChunk)
 origVelocityOnly = origMatrix[:,:, 1] # pick out just the velocity
 origLogicalMat = origVelocityOnly.astype(bool)
-origOneDimWithZeros = generateOneDimArray(origLogicalMat) # zeros where we want to delete columns
-origOnsetOnly = deleteGivenColumns(origLogicalMat, origOneDimWithZeros)
+# drop the frames with no notes, remembering when the ones that are left happen
+origOnsetOnly, origFrames, origTimes = pianoRoll.compactFrames(origLogicalMat, timePerChunk)
 
 
-godMatrix = createMatrixFromCSV('CSV_From_Midi/godowsky_chopin_etude_10_01_v1_(c)yogore.csv', True)
+godMatrix = createMatrixFromCSV('CSV_From_Midi/godowsky_chopin_etude_10_01_v1_(c)yogore.csv', True, timePerChunk)
 godVelocityOnly = godMatrix[:,:, 1] # pick out just the velocity
 godLogicalMat = godVelocityOnly.astype(bool)
-godOneDimWithZeros = generateOneDimArray(godLogicalMat) # zeros where we want to delete columns
-godOnsetOnly = deleteGivenColumns(godLogicalMat, godOneDimWithZeros)
+# drop the frames with no notes, remembering when the ones that are left happen
+godOnsetOnly, godFrames, godTimes = pianoRoll.compactFrames(godLogicalMat, timePerChunk)
 
 cosimilarityMat = findCosimilarityWithPitchShifts(origOnsetOnly, godOnsetOnly, 2)
 
 
-costAndOnsetsToMIDI(cosimilarityMat, origOnsetOnly, godOnsetOnly)
+costAndOnsetsToMIDI(cosimilarityMat, origOnsetOnly, godOnsetOnly, origTimes, godTimes)
 
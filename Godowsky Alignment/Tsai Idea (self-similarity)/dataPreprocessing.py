@@ -2,12 +2,15 @@ import sys
 import os
 sys.path.append(os.getcwd() + '/../..')
 
-import selfSimilarityMatrix
+import ingestCorpus
 
 # MIDI to CSV Files
 
 godowskyPath = '../Godowtsai Dataset/Godowsky/'
 chopinPath = '../Godowtsai Dataset/Chopin/'
 
-selfSimilarityMatrix.midiToCSV([godowskyPath], 'Godowsky_CSVs/')
-selfSimilarityMatrix.midiToCSV([chopinPath], 'Chopin_CSVs/')
\ No newline at end of file
+# the worker processes re-import this file, so only kick off the ingestion from the main one
+if __name__ == '__main__':
+	# only files that changed since the last run get re-parsed (see the manifest.json in each output directory)
+	ingestCorpus.ingestCorpus([godowskyPath], 'Godowsky_CSVs/')
+	ingestCorpus.ingestCorpus([chopinPath], 'Chopin_CSVs/')
\ No newline at end of file
@@ -1,8 +1,12 @@
 from mido import MidiFile
 import os
+import midiNotes
+import pianoRoll
+import rollDtypes
 import csv
 
 import numpy as np
+import scipy.sparse
 from PIL import Image
 import tensorflow as tf
 
@@ -21,57 +25,19 @@ def midiToCSV(directoriesIn, directoryOut):
             if '.DS_Store' not in files[i] and '._' not in files[i]:
                 totalFiles = totalFiles + 1
                 print('Processing file %g out of %g in directory: %s'%(i, len(files), files[i]))
-                mid = MidiFile(directory + files[i])
-
-                noteonList = []
-                midimsgList = []
-                accTime = []
-                countNote = 0
-                startTime = 0
-                
-                for msg in mid:
-
-                    # add all messages to list for ease of access
-                    midimsgList.append(msg)
-
-                    # Iterate through all midi message and accumulate time stamps
-                    if accTime == []:
-                        accTime.append(startTime)
-                    else:
-                        accTime.append(msg.time + accTime[-1])
-
-                for j in range(len(midimsgList)):
-                    msg = midimsgList[j]
-
-                    if msg.type == 'note_on' and msg.velocity > 0:
-                        countNote = countNote + 1 # for verification
-
-                        # loop through the message after the j-th message to find corresponding note-off event
-                        for k in range(j+1, len(midimsgList)):
-                            nextmsg = midimsgList[k]
-
-                            # Note: some midi files have no note-off events. Instead, it is note-on event with velocity = 0
-                            if nextmsg.type == 'note_off' or (nextmsg.type == 'note_on' and nextmsg.velocity == 0):
-                                if nextmsg.note == msg.note:
-                                    noteonList.append([msg.note, accTime[j], msg.velocity, accTime[k]-accTime[j]])
-                                    break
-
-                # Check that every note onset gets released
-                if countNote != len(noteonList):
-                    print("Mismatched number of data points. Something is wrong!", countNote, len(noteonList))
-                else:
-                    # Save list of note onsets to csv file
-                    name = files[i].split('.')
-                    outFileName = directoryOut +name[0]+'_'+directory[:-1]+'.csv'
-                    with open(outFileName, 'w') as csvfile:
-                        spamwriter = csv.writer(csvfile, delimiter=',',
-                                        quotechar='|', quoting=csv.QUOTE_MINIMAL)
-                        for row in noteonList:
-                            spamwriter.writerow(row)
-
-def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1):
+                noteonList, unmatchedList = midiNotes.midiFileToNotes(directory + files[i])
+
+                # notes that never get released are reported and left out, the rest of the file is still usable
+                midiNotes.reportUnmatchedNotes(files[i], unmatchedList)
+
+                # Save list of note onsets to csv file
+                name = files[i].split('.')
+                outFileName = directoryOut +name[0]+'_'+directory[:-1]+'.csv'
+                midiNotes.writeNoteCSV(noteonList, outFileName)
+
+def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1, dtypePolicy=None):
     '''
-    Take a CSV file where row represents a note onset (note, onset_time, velocity, duration)
+    Take a CSV file (or .npy note store, see noteStore.py) where row represents a note onset (note, onset_time, velocity, duration)
     and convert it into a matrix of size num_notes (128) x timeChunks x 2. The first element in the third
     dimension will be duration and the second will be velocity
 
@@ -79,43 +45,17 @@ def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1):
     If onsetOnly is false, the duration and velocity will appear in any time chunks the note is held during
 
     Inputs
-    filepath: Filepath of the CSV file
+    filepath: Filepath of the CSV file or .npy note store
     onsetOnly: whether to fill the matrix only at onset, or throughout its duration
     timePerChunk: how much time each column in the matrix represents
+    dtypePolicy: dtypes of the matrix (see rollDtypes.py), None for the default policy
 
     Output:
     a num_notes x timeChunks x 2 (duration and velocity) matrix. 
     '''
-    numPitches = 128;
-
-    # open your csv file
-    with open(filepath, 'r') as csvfile:
-        print("==> Reading File: %s"%(filepath))
-        myReader = csv.reader(csvfile)
-        # find the max time to figure out how big your matrix should be
-        maxTime = max([float(row[1]) for row in myReader])
-        # reset the reader
-        csvfile.seek(0)
-
-        # open it again to actually parse it, now that you know how big your matrix should be
-        curMatrix = np.zeros((numPitches, int(np.ceil(maxTime / timePerChunk)), 2))
-        
-        # read each row and add into the matrix that represents the song
-        # the csv is in the form: note, time, velocity, duration and has a row for every note onset in the song
-        numNotes = 0
-        for row in myReader:
-            numNotes = numNotes + 1
-            [note, curTime, velocity, duration] = [int(row[0]), float(row[1]), int(row[2]), float(row[3])]
-            
-            # either put an entry just for the onset, or put an entry at every point in its duration
-            if onsetOnly:
-                curMatrix[note, int(np.floor(curTime / timePerChunk)), :] = [duration, velocity]
-            else :
-                # fill in spots after the onset based on the duration
-                # any spot in the matrix it is on during gets turned on
-                curMatrix[note, int(np.floor(curTime / timePerChunk)):int(np.floor((curTime + duration) / timePerChunk)) + 1, :] = [duration, velocity]
-
-    return curMatrix
+    # with the artifact cache on, the roll is cached on disk by the contents of the file (see artifactCache.py), so only new or changed files get read
+    print("==> Reading File: %s"%(filepath))
+    return pianoRoll.loadPianoRoll(filepath, onsetOnly, timePerChunk, dtypePolicy)
 
 def sampleFromMatrix(matrix_in, sample_rows, sample_cols):
     '''
@@ -128,22 +68,28 @@ def sampleFromMatrix(matrix_in, sample_rows, sample_cols):
     # select a start row and column for your submatrix
     start_row = np.random.randint(in_rows - sample_rows + 1) # not inclusive, so between 0 and inRows - sample_rows inclusive
     start_col = np.random.randint(in_cols - sample_cols + 1)
-    return matrix_in[start_row:(start_row + sample_rows), start_col:(start_col + sample_cols)]
+    sample = matrix_in[start_row:(start_row + sample_rows), start_col:(start_col + sample_cols)]
+    # sparse rolls (see pianoRoll.buildSparseRoll) only get densified one sample at a time
+    if scipy.sparse.issparse(sample):
+        sample = sample.toarray()
+    return sample
 
-def getSamplesFromSong(song_matrix, num_samples, sample_rows, sample_cols):
+def getSamplesFromSong(song_matrix, num_samples, sample_rows, sample_cols, dtypePolicy=None):
     '''
     Get many samples from a song, and output a matrix where each row corresponds to a sample
     Input: song_matrix - a 2-d matrix where the rows correspond to pitch and the cols correspond to time. We'll sample from this
+                         (dense, or a scipy.sparse roll)
            num_samples - the number of samples to Take
            sample_rows - rows in the sample
            sample_cols - columns in the sample
+           dtypePolicy - the samples come out in its features dtype (see rollDtypes.py)
     Output: A 2-d matrix, where each row corresponds to an "unwrapped sample"
             where "unwrapping" is taking the 2-d sample and rolling it out into a row.
             Columns are iterated over first then rows e.g x = [1, 2] becomes [1, 2, 3, 4]
                                                                [3, 4]
     '''
     # make an empty matrix to store your samples
-    sample_matrix = np.empty((num_samples, sample_rows * sample_cols))
+    sample_matrix = np.empty((num_samples, sample_rows * sample_cols), dtype=rollDtypes.fieldDtype('features', dtypePolicy))
     # Sample, unwrap, and store in sample_matrix num_samples times
     for i in range(num_samples):
         cur_sample = sampleFromMatrix(song_matrix, sample_rows, sample_cols)
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import zipfile
+
+import numpy as np
+import scipy.sparse
+
+import fileHash
+
+'''
+On-disk cache for things derived from the pieces (piano rolls, self-similarity and
+cosimilarity matrices, DTW accumulated costs...), so re-running a script doesn't redo
+work it already did.
+
+Artifacts are content addressed: the key is a hash of the function name, its parameters
+and the contents of its inputs (files or arrays), so changing any of them gives a new key
+and stale artifacts are never read. The cache is capped at maxBytes; when it's over, the
+least recently used artifacts get deleted first (every hit touches the file's mtime).
+
+The cache is off unless it's asked for, then every cachedCall just computes. Turn it on
+by setting MIR_ARTIFACT_CACHE to the directory to keep it in, or from a script:
+artifactCache.configure('Artifact_Cache')
+
+ex:
+cosimilarityMat = artifactCache.cachedCall('findCosimilarityMatrix', [mat1, mat2], {'hopsize': 1},
+										   lambda: computeIt(mat1, mat2))
+
+Artifacts can be numpy arrays, scipy.sparse matrices, or tuples / lists of arrays.
+'''
+
+cacheDirectory = os.environ.get('MIR_ARTIFACT_CACHE', 'Artifact_Cache')
+maxBytes = 2 * 1024 ** 3
+enabled = 'MIR_ARTIFACT_CACHE' in os.environ
+
+def configure(directory=None, sizeCap=None, enable=None):
+	'''
+	Change where the cache lives, how big it can get (in bytes) and whether it's used at all.
+	Giving a directory turns the cache on unless enable says otherwise.
+	'''
+	global cacheDirectory, maxBytes, enabled
+	if directory is not None:
+		cacheDirectory = directory
+		if enable is None:
+			enable = True
+	if sizeCap is not None:
+		maxBytes = sizeCap
+	if enable is not None:
+		enabled = enable
+
+def hashInput(value):
+	'''
+	Content hash of one input: a file path, a numpy array or a scipy.sparse matrix
+	'''
+	digest = hashlib.sha1()
+	if isinstance(value, str):
+		return fileHash.hashFile(value)
+	if scipy.sparse.issparse(value):
+		value = value.tocsc()
+		value.sum_duplicates()
+		digest.update(('sparse %s %s'%(value.shape, value.dtype.str)).encode())
+		for part in (value.data, value.indices, value.indptr):
+			digest.update(np.ascontiguousarray(part).tobytes())
+		return digest.hexdigest()
+	value = np.ascontiguousarray(value)
+	digest.update(('array %s %s'%(value.shape, value.dtype.str)).encode())
+	digest.update(value.tobytes())
+	return digest.hexdigest()
+
+def artifactKey(name, inputs, params):
+	'''
+	Key of an artifact: name of the function that made it, content hashes of its inputs and its parameters
+	(params has to be json-able as is, ex: rollDtypes.policyKey rather than a policy of numpy types)
+	'''
+	description = json.dumps({'name': name, 'inputs': [hashInput(value) for value in inputs], 'params': params},
+							 sort_keys=True)
+	return hashlib.sha1(description.encode()).hexdigest()
+
+def artifactPaths(key):
+	'''
+	Every path an artifact with this key could be stored at, one per kind of artifact
+	'''
+	base = os.path.join(cacheDirectory, key)
+	return {'array': base + '.npy', 'sparse': base + '.sparse.npz', 'tuple': base + '.tuple.npz'}
+
+def loadArtifact(key):
+	'''
+	Load an artifact, or None if it isn't cached
+	'''
+	for kind, path in artifactPaths(key).items():
+		if not os.path.exists(path):
+			continue
+		try:
+			if kind == 'array':
+				artifact = np.load(path)
+			elif kind == 'sparse':
+				artifact = scipy.sparse.load_npz(path)
+			else:
+				with np.load(path) as parts:
+					artifact = tuple(parts['arr_%d'%(i)] for i in range(len(parts.files)))
+		except (IOError, ValueError, zipfile.BadZipFile) as e:
+			# a damaged artifact is a miss, it gets overwritten by the recomputed one
+			print("==> Couldn't load cached artifact %s: %r"%(path, e))
+			return None
+		# mark it as recently used
+		os.utime(path, None)
+		return artifact
+	return None
+
+def storeArtifact(key, artifact):
+	'''
+	Save an artifact, then evict the least recently used ones if the cache is over its cap
+	'''
+	if not os.path.isdir(cacheDirectory):
+		os.makedirs(cacheDirectory)
+
+	paths = artifactPaths(key)
+	if scipy.sparse.issparse(artifact):
+		path = paths['sparse']
+	elif isinstance(artifact, (tuple, list)):
+		path = paths['tuple']
+	else:
+		path = paths['array']
+
+	# write to a temporary file first so an interrupted run (or another process) never sees half an artifact
+	tempPath = path + '.tmp'
+	with open(tempPath, 'wb') as f:
+		if scipy.sparse.issparse(artifact):
+			scipy.sparse.save_npz(f, artifact)
+		elif isinstance(artifact, (tuple, list)):
+			np.savez(f, *[np.asarray(part) for part in artifact])
+		else:
+			np.save(f, np.asarray(artifact))
+	os.replace(tempPath, path)
+
+	evict(maxBytes)
+
+def evict(sizeCap):
+	'''
+	Delete the least recently used artifacts until the cache takes up at most sizeCap bytes
+	'''
+	if not os.path.isdir(cacheDirectory):
+		return
+	entries = []
+	for filename in os.listdir(cacheDirectory):
+		if filename.endswith('.tmp'):
+			continue
+		path = os.path.join(cacheDirectory, filename)
+		stat = os.stat(path)
+		entries.append((stat.st_mtime, stat.st_size, path))
+
+	totalBytes = sum(size for _, size, _ in entries)
+	for mtime, size, path in sorted(entries):
+		if totalBytes <= sizeCap:
+			break
+		os.remove(path)
+		totalBytes = totalBytes - size
+
+def cachedCall(name, inputs, params, compute):
+	'''
+	Return the cached artifact for (name, inputs, params), computing and caching it if it isn't there
+
+	Inputs
+	name: name of the function (bump a version in it when what the function computes changes)
+	inputs: list of file paths and arrays the artifact is derived from, hashed by content
+	params: json-able dict of the other parameters
+	compute: function with no arguments that computes the artifact
+	'''
+	if not enabled:
+		return compute()
+	key = artifactKey(name, inputs, params)
+	artifact = loadArtifact(key)
+	if artifact is None:
+		artifact = compute()
+		storeArtifact(key, artifact)
+	return artifact
@@ -0,0 +1,220 @@
+import numpy as np
+import scipy.sparse
+
+import nGramCounts
+
+'''
+Generate lots of sequences at once (ex: thousands of songs for a listening test or for
+statistics) instead of one note at a time in python. All the sequences move forward in
+lockstep: every step looks up the context of every sequence together and draws every
+next note together.
+
+The random numbers for the whole batch are one numSequences x numSteps matrix drawn up
+front. Each draw is an inverse-CDF lookup: all the distributions are laid end to end in
+one increasing array (each one shifted up by the totals of the ones before it), so the
+draws of the whole batch are a single np.searchsorted.
+
+ex: 2000 songs of 200 notes from the trigrams of a melody
+model = nGramModel.modelFromSequence(melody, 3)
+songs = generateNGramBatch(model, np.tile(melody[:2], (2000, 1)), 200)
+
+ex: 2000 walks of a transition matrix starting from note 70
+songs = generateMarkovBatch(transitionMatrix, columnNotes(noteToColumnDict), np.full(2000, 70), 200)
+'''
+
+def uniformMatrix(numSequences, numSteps, rng=None, sequenceSeeds=None):
+	'''
+	The random numbers in [0, 1) for a batch, one row per sequence
+
+	Inputs
+	rng: numpy random Generator, defaults to a fresh one
+	sequenceSeeds: optional seed for every sequence, so any one sequence can be made
+				   again on its own no matter what else is in the batch
+	'''
+	if sequenceSeeds is not None:
+		if len(sequenceSeeds) != numSequences:
+			raise ValueError('need one seed per sequence, got %d for %d sequences'%(len(sequenceSeeds), numSequences))
+		return np.stack([np.random.default_rng(seed).random(numSteps) for seed in sequenceSeeds]).reshape(numSequences, numSteps)
+	if rng is None:
+		rng = np.random.default_rng()
+	return rng.random((numSequences, numSteps))
+
+def modelOrderCdf(model, k):
+	'''
+	The running counts of every context of order k laid end to end as one increasing array
+
+	Output:
+	flatCdf: the running counts, each context shifted up by the totals of the contexts before it
+	contextBase: where each context starts in flatCdf
+	contextTotals: total count of each context
+	'''
+	offsets = model['offsets'][k]
+	cumulativeCounts = model['cumulativeCounts'][k]
+	contextTotals = cumulativeCounts[offsets[1:] - 1]
+	contextBase = np.cumsum(contextTotals) - contextTotals
+	return cumulativeCounts + np.repeat(contextBase, np.diff(offsets)), contextBase, contextTotals
+
+def findContexts(model, ids, position, usable):
+	'''
+	Vectorized nGramModel.findContext: the longest seen context of every sequence right
+	before position, backing off to shorter ones
+
+	Inputs
+	ids: numSequences x length array of symbol ids
+	position: the column about to be drawn
+	usable: how many of the symbols right before position each sequence can use (see nGramModel.historyIds)
+
+	Output:
+	order, index: arrays with the order and context index found for each sequence
+	'''
+	numSequences = ids.shape[0]
+	vocabularySize = len(model['vocabulary'])
+	order = np.zeros(numSequences, dtype=np.int64)
+	index = np.zeros(numSequences, dtype=np.int64)
+	for k in range(model['maxOrder'], 0, -1):
+		rows = np.flatnonzero((order == 0) & (usable >= k - 1))
+		if len(rows) == 0:
+			continue
+		contextKeys = model['contextKeys'][k]
+		keys = nGramCounts.gramKeys(ids[rows, position - (k - 1):position], vocabularySize)
+		found = np.searchsorted(contextKeys, keys)
+		seen = found < len(contextKeys)
+		seen[seen] = contextKeys[found[seen]] == keys[seen]
+		order[rows[seen]] = k
+		index[rows[seen]] = found[seen]
+	return order, index
+
+def generateNGramBatch(model, seeds, numSteps, rng=None, sequenceSeeds=None):
+	'''
+	Generate many sequences from an n-gram model (see nGramModel.py) in lockstep, with the
+	same backoff as nGramModel.generate
+
+	Inputs
+	seeds: numSequences x seedLength array of starting symbols (np.tile one seed to start them all the same)
+	numSteps: how many symbols to draw after each seed
+	rng: numpy random Generator, defaults to a fresh one
+	sequenceSeeds: optional random seed for every sequence (see uniformMatrix)
+
+	Output:
+	numSequences x (seedLength + numSteps) array of symbols
+	'''
+	if len(model['vocabulary']) == 0:
+		raise ValueError("can't generate from an empty n-gram model")
+	seeds = np.asarray(seeds)
+	if seeds.ndim == 1:
+		seeds = seeds.reshape(-1, 1)
+	numSequences, seedLength = seeds.shape
+	uniforms = uniformMatrix(numSequences, numSteps, rng, sequenceSeeds)
+	contextLength = model['maxOrder'] - 1
+	vocabulary = model['vocabulary']
+
+	ids = np.zeros((numSequences, seedLength + numSteps), dtype=np.int64)
+	ids[:, :seedLength], known = nGramCounts.findSymbols(seeds, vocabulary)
+	# a context can't reach back past a seed symbol that isn't in the vocabulary
+	trailingKnown = np.argmin(np.hstack([known[:, ::-1], np.zeros((numSequences, 1), dtype=bool)]), axis=1)
+	usable = np.minimum(trailingKnown, contextLength)
+
+	cdfs = dict((k, modelOrderCdf(model, k)) for k in range(1, model['maxOrder'] + 1))
+	for step in range(numSteps):
+		position = seedLength + step
+		order, index = findContexts(model, ids, position, usable)
+		for k in np.unique(order):
+			rows = np.flatnonzero(order == k)
+			flatCdf, contextBase, contextTotals = cdfs[k]
+			targets = contextBase[index[rows]] + uniforms[rows, step] * contextTotals[index[rows]]
+			ids[rows, position] = model['successors'][k][np.searchsorted(flatCdf, targets, side='right')]
+		usable = np.minimum(usable + 1, contextLength)
+
+	sequences = vocabulary[ids]
+	sequences[:, :seedLength] = seeds
+	return sequences
+
+def columnNotes(noteToColumnDict):
+	'''
+	Inverse of a transition matrix's noteToColumnDict: array with the note of every column
+	'''
+	notes = np.zeros(len(noteToColumnDict), dtype=np.array(list(noteToColumnDict.keys())).dtype)
+	notes[list(noteToColumnDict.values())] = list(noteToColumnDict.keys())
+	return notes
+
+def transitionCdf(transitionMatrix):
+	'''
+	The columns of a transition matrix (column i is the distribution of the note after
+	note i) as running sums over their non zero entries, laid end to end with column i
+	shifted up by i. Works the same for dense and scipy.sparse matrices, a draw only ever
+	looks at the non zero entries of one column.
+
+	Output:
+	flatCdf: increasing array, one entry per non zero entry of the matrix
+	rows: the row (next note) of every entry of flatCdf
+	columnStarts: entries of column i are flatCdf[columnStarts[i]:columnStarts[i + 1]]
+	'''
+	# a copy, eliminate_zeros and sort_indices work in place and the matrix may be a read-only memory map (see modelFile.py)
+	columns = scipy.sparse.csc_matrix(transitionMatrix, dtype=np.float64, copy=True)
+	columns.eliminate_zeros()
+	columns.sort_indices()
+	columnStarts = columns.indptr.astype(np.int64)
+	lengths = np.diff(columnStarts)
+	used = lengths > 0
+
+	# running sum within each column: the overall running sum minus what came before the column
+	running = np.cumsum(columns.data)
+	starts = columnStarts[:-1][used]
+	withinColumn = running - np.repeat(running[starts] - columns.data[starts], lengths[used])
+	# rescale so every column ends at exactly 1, rounding can't spill a draw into the next column
+	totals = np.repeat(withinColumn[columnStarts[1:][used] - 1], lengths[used])
+	columnOf = np.repeat(np.arange(len(lengths)), lengths)
+	return withinColumn / totals + columnOf, columns.indices.astype(np.int64), columnStarts
+
+def walkColumns(transitionMatrix, startColumns, uniforms):
+	'''
+	Walk a transition matrix from every start column in lockstep, each next column drawn from
+	the column before it with the matching row of uniforms (numSequences x numSteps, see
+	uniformMatrix). A column of zeros (never followed by anything) just repeats.
+
+	Output:
+	numSequences x (numSteps + 1) array of columns
+	'''
+	flatCdf, rows, columnStarts = transitionCdf(transitionMatrix)
+	deadEnds = columnStarts[1:] == columnStarts[:-1]
+	numSequences, numSteps = uniforms.shape
+
+	columns = np.zeros((numSequences, numSteps + 1), dtype=np.int64)
+	columns[:, 0] = startColumns
+	if len(rows) == 0:
+		# nothing is ever followed by anything
+		columns[:] = columns[:, :1]
+		return columns
+	for step in range(numSteps):
+		current = columns[:, step]
+		# binary search for every sequence at once, kept inside its own column in case current + u rounds up to the next one
+		drawn = np.minimum(np.searchsorted(flatCdf, current + uniforms[:, step], side='right'), columnStarts[current + 1] - 1)
+		columns[:, step + 1] = np.where(deadEnds[current], current, rows[np.maximum(drawn, 0)])
+	return columns
+
+def generateMarkovBatch(transitionMatrix, notes, startNotes, numSteps, rng=None, sequenceSeeds=None):
+	'''
+	Generate many walks of a transition matrix in lockstep, each next note drawn from the
+	column of the note before it
+
+	Inputs
+	transitionMatrix: numNotes x numNotes, dense or scipy.sparse, column i is the distribution of the note after note i
+	notes: the note of every column (see columnNotes)
+	startNotes: the first note of every sequence
+	numSteps: how many notes to draw after the first
+	rng: numpy random Generator, defaults to a fresh one
+	sequenceSeeds: optional random seed for every sequence (see uniformMatrix)
+
+	Output:
+	numSequences x (numSteps + 1) array of notes. A note that was never followed by
+	anything (a column of zeros) just repeats.
+	'''
+	notes = np.asarray(notes)
+	startNotes = np.asarray(startNotes)
+	order = np.argsort(notes, kind='stable')
+	positions, found = nGramCounts.findSymbols(startNotes, notes[order])
+	if not np.all(found):
+		raise ValueError('start notes %s have no column in the transition matrix'%(np.unique(startNotes[~found]).tolist()))
+	startColumns = order[positions]
+	uniforms = uniformMatrix(len(startColumns), numSteps, rng, sequenceSeeds)
+	return notes[walkColumns(transitionMatrix, startColumns, uniforms)]
@@ -0,0 +1,98 @@
+import numpy as np
+
+import frameSimilarity
+import pianoRoll
+
+'''
+Chord tokens: every frame of a roll that has notes in it becomes one integer, the index
+of its pitch set in a chord vocabulary. Unlike the top voice (see voices.py) this keeps
+all of the polyphony, and the tokens go straight into the n-gram code (nGramCounts.py,
+nGramModel.py, batchGeneration.py) like pitches do.
+
+The pitch set of a frame is bit-packed into two uint64 words (see frameSimilarity.packFrames),
+viewed as one 16 byte key, and the vocabulary is the np.unique of those keys, so building
+it over a whole corpus is one sort no matter how many pieces there are.
+
+A chord vocabulary is a sorted K x 2 uint64 array of packed pitch sets, token t is row t.
+
+ex: chord trigrams of a piece, generated and written back out as chords
+tokens, frames, vocabulary = tokenize(logicalMat)
+model = nGramModel.modelFromSequence(tokens, 3)
+song = nGramModel.generate(model, tokens[:2], 200)
+midiNotes.writeChordMidi(chordRoll(song, vocabulary), 'Midi/trigram_chords.mid')
+'''
+
+def chordKeys(packed):
+	'''
+	One 16 byte key per row of a k x 2 array of packed pitch sets
+	'''
+	return np.ascontiguousarray(packed, dtype='<u8').view(np.dtype((np.void, 16))).ravel()
+
+def packedChords(logicalMat):
+	'''
+	The packed pitch set of every frame of a num_notes x timeChunks matrix that has notes in it
+
+	Output:
+	packed: k x 2 uint64 array, one row per frame with notes
+	frames: which frame (column of logicalMat) each row comes from
+	'''
+	packed = frameSimilarity.packFrames(logicalMat)
+	frames = np.flatnonzero(np.any(packed != 0, axis=1))
+	return packed[frames], frames
+
+def buildVocabulary(logicalMats):
+	'''
+	The chord vocabulary of a list of num_notes x timeChunks matrices (dense or scipy.sparse)
+	'''
+	packed = [packedChords(logicalMat)[0] for logicalMat in logicalMats]
+	keys = np.unique(chordKeys(np.concatenate(packed) if packed else np.zeros((0, 2), dtype='<u8')))
+	return np.frombuffer(keys.tobytes(), dtype='<u8').reshape(-1, 2)
+
+def corpusVocabulary(filepaths, timePerChunk=0.1):
+	'''
+	The chord vocabulary of the onset rolls of a list of CSVs or note stores (rolls are
+	cached, see pianoRoll.loadPianoRoll)
+	'''
+	return buildVocabulary(pianoRoll.loadPianoRoll(filepath, True, timePerChunk)[:, :, 1] for filepath in filepaths)
+
+def tokenize(logicalMat, vocabulary=None):
+	'''
+	The chord token of every frame of a num_notes x timeChunks matrix that has notes in it
+
+	Inputs
+	logicalMat: num_notes (up to 128) x timeChunks matrix, dense or scipy.sparse. Anything non zero counts as on.
+	vocabulary: chord vocabulary to number the chords with, defaults to the chords of this matrix
+
+	Output:
+	tokens: int64 array, one token per frame with notes (-1 for chords that aren't in the vocabulary)
+	frames: which frame (column of logicalMat) each token comes from
+	vocabulary: the chord vocabulary used
+	'''
+	packed, frames = packedChords(logicalMat)
+	if vocabulary is None:
+		vocabulary = buildVocabulary([logicalMat])
+	vocabularyKeys = chordKeys(vocabulary)
+	keys = chordKeys(packed)
+	tokens = np.searchsorted(vocabularyKeys, keys).astype(np.int64)
+	found = tokens < len(vocabularyKeys)
+	found[found] = vocabularyKeys[tokens[found]] == keys[found]
+	tokens[~found] = -1
+	return tokens, frames, vocabulary
+
+def chordRoll(tokens, vocabulary, numPitches=128):
+	'''
+	Turn chord tokens back into a num_notes x len(tokens) boolean roll, one chord per frame
+	(a token of -1 gives an empty frame)
+	'''
+	tokens = np.asarray(tokens, dtype=np.int64)
+	pitchSets = np.unpackbits(np.ascontiguousarray(vocabulary, dtype='<u8').view(np.uint8), axis=1, bitorder='little').astype(bool)
+	roll = np.zeros((len(tokens), numPitches), dtype=bool)
+	known = tokens >= 0
+	roll[known] = pitchSets[tokens[known], :numPitches]
+	return roll.T
+
+def chordPitches(vocabulary, token):
+	'''
+	The pitches of one chord token, lowest first
+	'''
+	return np.flatnonzero(chordRoll([token], vocabulary)[:, 0])
@@ -0,0 +1,189 @@
+import os
+import re
+import sqlite3
+
+import mido
+import numpy as np
+
+'''
+SQLite catalog of the corpus. ingestCorpus.py fills it in from what it learns while
+pairing the notes of each piece, so batch jobs can pick their pieces with a query
+instead of a hard coded list or re-reading the MIDI files.
+
+ex: every Godowsky version of op. 10 longer than 3 minutes
+findPieces('Godowsky_CSVs/catalog.sqlite', composer='godowsky', opus=10, minDuration=180)
+
+ex: every file that had notes that were never released (or couldn't be read at all)
+findPieces('Godowsky_CSVs/catalog.sqlite', failed=True)
+'''
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pieces (
+	source TEXT PRIMARY KEY,
+	hash TEXT,
+	composer TEXT,
+	version INTEGER,
+	opus INTEGER,
+	etude INTEGER,
+	numNotes INTEGER,
+	numUnmatched INTEGER,
+	duration REAL,
+	minPitch INTEGER,
+	maxPitch INTEGER,
+	numTempoChanges INTEGER,
+	initialBPM REAL,
+	minBPM REAL,
+	maxBPM REAL,
+	error TEXT
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+	source TEXT NOT NULL REFERENCES pieces(source) ON DELETE CASCADE,
+	kind TEXT NOT NULL,
+	path TEXT NOT NULL,
+	PRIMARY KEY (source, kind)
+);
+CREATE INDEX IF NOT EXISTS pieces_key ON pieces (composer, opus, etude, version);
+CREATE INDEX IF NOT EXISTS pieces_duration ON pieces (duration);
+CREATE INDEX IF NOT EXISTS pieces_unmatched ON pieces (numUnmatched);
+'''
+
+PIECE_COLUMNS = ['source', 'hash', 'composer', 'version', 'opus', 'etude', 'numNotes', 'numUnmatched', 'duration',
+				 'minPitch', 'maxPitch', 'numTempoChanges', 'initialBPM', 'minBPM', 'maxBPM', 'error']
+
+# the naming schemes used in the Godowtsai Dataset and in CSV_From_Midi
+PIECE_NAME_PATTERNS = [
+	re.compile(r'(?P<composer>godowsky)_v(?P<version>\d+)_chopin_op(?P<opus>\d+)_e(?P<etude>\d+)'),
+	re.compile(r'(?P<composer>godowsky)_chopin_etude_(?P<opus>\d+)_(?P<etude>\d+)(?:_v(?P<version>\d+))?'),
+	re.compile(r'(?P<composer>chopin|chpn)_op(?P<opus>\d+)_e(?P<etude>\d+)'),
+]
+
+def parsePieceKey(filename):
+	'''
+	Work out composer, version, opus and etude from a file name
+
+	ex: godowsky_v2_chopin_op10_e05.mid -> {'composer': 'godowsky', 'version': 2, 'opus': 10, 'etude': 5}
+		chopin_op25_e11.mid -> {'composer': 'chopin', 'version': None, 'opus': 25, 'etude': 11}
+
+	Anything that doesn't follow one of the naming schemes gets all None
+	'''
+	name = os.path.basename(filename).lower()
+	for pattern in PIECE_NAME_PATTERNS:
+		match = pattern.search(name)
+		if match:
+			key = match.groupdict()
+			return {'composer': 'chopin' if key['composer'] == 'chpn' else key['composer'],
+					'version': int(key['version']) if key.get('version') else None,
+					'opus': int(key['opus']),
+					'etude': int(key['etude'])}
+	return {'composer': None, 'version': None, 'opus': None, 'etude': None}
+
+def pieceStatistics(noteonList, tempos):
+	'''
+	Summarize a piece for the catalog
+
+	Inputs
+	noteonList: paired notes, rows of [note, onset_time, velocity, duration, ...]
+	tempos: the tempo (microseconds per beat) of every set_tempo message, in order
+
+	Output:
+	dict with duration (end of the last note, in seconds), pitch range and a summary of the tempo map
+	'''
+	stats = {'duration': 0.0, 'minPitch': None, 'maxPitch': None,
+			 'numTempoChanges': len(tempos), 'initialBPM': None, 'minBPM': None, 'maxBPM': None}
+	if noteonList:
+		table = np.array([row[:4] for row in noteonList], dtype=np.float64)
+		stats['duration'] = float(np.max(table[:, 1] + table[:, 3]))
+		stats['minPitch'] = int(np.min(table[:, 0]))
+		stats['maxPitch'] = int(np.max(table[:, 0]))
+	if tempos:
+		bpms = [mido.tempo2bpm(tempo) for tempo in tempos]
+		stats['initialBPM'] = bpms[0]
+		stats['minBPM'] = min(bpms)
+		stats['maxBPM'] = max(bpms)
+	return stats
+
+def openCatalog(catalogPath):
+	'''
+	Open (and create, if needed) the catalog database
+	'''
+	conn = sqlite3.connect(catalogPath)
+	conn.row_factory = sqlite3.Row
+	conn.execute('PRAGMA foreign_keys = ON')
+	conn.executescript(SCHEMA)
+	return conn
+
+def updateCatalog(catalogPath, manifest):
+	'''
+	Make the catalog match an ingestion manifest (see ingestCorpus.py): add or update
+	every piece in it, and drop pieces that aren't in it anymore
+	'''
+	conn = openCatalog(catalogPath)
+	with conn:
+		known = set(row['source'] for row in conn.execute('SELECT source FROM pieces'))
+		for source in known - set(manifest.keys()):
+			conn.execute('DELETE FROM pieces WHERE source = ?', (source,))
+
+		for source, entry in manifest.items():
+			piece = dict(entry)
+			piece.update(parsePieceKey(source))
+			piece['source'] = source
+			conn.execute('INSERT OR REPLACE INTO pieces (%s) VALUES (%s)'%(', '.join(PIECE_COLUMNS), ', '.join('?' * len(PIECE_COLUMNS))),
+						 [piece.get(column) for column in PIECE_COLUMNS])
+
+			conn.execute('DELETE FROM artifacts WHERE source = ?', (source,))
+			for kind, path in [('csv', entry.get('output')), ('notes', entry.get('notes'))]:
+				if path is not None:
+					conn.execute('INSERT INTO artifacts (source, kind, path) VALUES (?, ?, ?)', (source, kind, path))
+	conn.close()
+
+def addArtifact(catalogPath, source, kind, path):
+	'''
+	Record the path of something derived from a piece (a piano roll cache, a model...)
+	'''
+	conn = openCatalog(catalogPath)
+	with conn:
+		conn.execute('INSERT OR REPLACE INTO artifacts (source, kind, path) VALUES (?, ?, ?)', (source, kind, path))
+	conn.close()
+
+def findPieces(catalogPath, composer=None, version=None, opus=None, etude=None,
+			   minDuration=None, maxDuration=None, failed=None):
+	'''
+	Look up pieces in the catalog. Every argument left as None matches anything.
+
+	failed: True for pieces that couldn't be read or had notes that were never released,
+			False for the ones that paired cleanly
+
+	Output:
+	list of dicts, one per piece, with every column of the pieces table plus an
+	'artifacts' dict mapping kind -> path (ex: artifacts['notes'] is the .npy note store)
+	'''
+	conditions = []
+	params = []
+	for column, value in [('composer', composer), ('version', version), ('opus', opus), ('etude', etude)]:
+		if value is not None:
+			conditions.append('%s = ?'%(column))
+			params.append(value)
+	if minDuration is not None:
+		conditions.append('duration >= ?')
+		params.append(minDuration)
+	if maxDuration is not None:
+		conditions.append('duration <= ?')
+		params.append(maxDuration)
+	if failed is not None:
+		failedCondition = '(error IS NOT NULL OR numUnmatched > 0)'
+		conditions.append(failedCondition if failed else 'NOT %s'%(failedCondition))
+
+	query = 'SELECT * FROM pieces'
+	if conditions:
+		query = query + ' WHERE ' + ' AND '.join(conditions)
+	query = query + ' ORDER BY composer, opus, etude, version'
+
+	conn = openCatalog(catalogPath)
+	pieces = []
+	for row in conn.execute(query, params).fetchall():
+		piece = dict(row)
+		piece['artifacts'] = dict((artifact['kind'], artifact['path']) for artifact in
+								  conn.execute('SELECT kind, path FROM artifacts WHERE source = ?', (piece['source'],)))
+		pieces.append(piece)
+	conn.close()
+	return pieces
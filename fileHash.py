@@ -0,0 +1,16 @@
+import hashlib
+
+'''
+Content hashes of files, shared by everything that needs to notice when a piece changed
+(ingestCorpus.py, nGramCorpus.py, artifactCache.py, rollPyramid.py)
+'''
+
+def hashFile(filepath):
+	'''
+	Hash the contents of a file (sha1, as a hex string)
+	'''
+	digest = hashlib.sha1()
+	with open(filepath, 'rb') as f:
+		for block in iter(lambda: f.read(1 << 20), b''):
+			digest.update(block)
+	return digest.hexdigest()
@@ -0,0 +1,195 @@
+import numpy as np
+import scipy.sparse
+
+import rollDtypes
+
+'''
+Frame by frame similarity between piano rolls (num_notes x timeChunks matrices, dense or
+scipy.sparse), shared by similarity (selfSimilarityMatrix.py) and findCosimilarityMatrix
+(makeCost.py, DTW_And_Reconstruction.py).
+
+The similarity of two windows of frames is 2 * (notes on in both) / (notes on in one + notes on in the other).
+Instead of comparing every pair of windows in python, the "on in both" counts for every pair of
+frames come out of one matrix product of the boolean rolls, which for sparse rolls only touches
+the notes that are actually on. The similarity matrices come out in the features dtype of the
+dtype policy (see rollDtypes.py).
+
+Rolls can also be bit-packed: each frame becomes two uint64 words, one bit per pitch, so a whole
+piece is 16 bytes per frame. The "on in both" count of two frames is then the popcount of their
+AND, see packFrames and packedSharedCounts. That's opt-in (packed=True): for dense rolls the
+float32 BLAS product is faster, packing is for when the float32 copies of the rolls are too big.
+'''
+
+# 128 pitches -> two 64 bit words per frame
+FRAME_WORDS = 2
+
+def packFrames(mat):
+	'''
+	Bit-pack the frames of a num_notes (up to 128) x timeChunks matrix, dense or scipy.sparse.
+	Bit p of a frame is set when pitch p is on (non zero) in it.
+
+	Output:
+	a timeChunks x 2 uint64 array, pitches 0-63 in the first word and 64-127 in the second
+	'''
+	if scipy.sparse.issparse(mat):
+		mat = mat.toarray()
+	mat = np.asarray(mat)
+	if mat.shape[0] > 64 * FRAME_WORDS:
+		raise ValueError('can only pack up to %d pitches, got %d'%(64 * FRAME_WORDS, mat.shape[0]))
+
+	onFrames = np.zeros((mat.shape[1], 64 * FRAME_WORDS), dtype=bool)
+	onFrames[:, :mat.shape[0]] = (mat != 0).T
+	# little endian bit order puts pitch p at bit p % 64 of word p // 64
+	return np.packbits(onFrames, axis=1, bitorder='little').view('<u8')
+
+def popcount(words):
+	'''
+	Number of bits set in each element of an unsigned integer array
+	'''
+	if hasattr(np, 'bitwise_count'):
+		return np.bitwise_count(words)
+	# numpy < 2.0 has no popcount, count the bits of 64 bit words in parallel instead
+	words = words - ((words >> np.uint64(1)) & np.uint64(0x5555555555555555))
+	words = (words & np.uint64(0x3333333333333333)) + ((words >> np.uint64(2)) & np.uint64(0x3333333333333333))
+	words = (words + (words >> np.uint64(4))) & np.uint64(0x0f0f0f0f0f0f0f0f)
+	return ((words * np.uint64(0x0101010101010101)) >> np.uint64(56)).astype(np.uint8)
+
+def packedOnCounts(packed):
+	'''
+	Number of notes on in each frame of a packed roll (see packFrames)
+	'''
+	return np.sum(popcount(packed), axis=1, dtype=np.int64)
+
+def packedSharedCounts(packedA, packedB, blockRows=64):
+	'''
+	sharedNoteCounts for packed rolls (see packFrames): popcount of the AND of every pair of frames
+
+	Inputs
+	packedA, packedB: timeChunks x 2 packed rolls
+	blockRows: frames of packedA done at a time, keeps the temporaries in cache
+
+	Output:
+	a timeChunksA x timeChunksB uint8 matrix (counts are at most 128)
+	'''
+	shared = np.empty((packedA.shape[0], packedB.shape[0]), dtype=np.uint8)
+	for start in range(0, packedA.shape[0], blockRows):
+		block = packedA[start:start + blockRows]
+		counts = popcount(block[:, np.newaxis, 0] & packedB[np.newaxis, :, 0])
+		for word in range(1, FRAME_WORDS):
+			counts += popcount(block[:, np.newaxis, word] & packedB[np.newaxis, :, word])
+		shared[start:start + blockRows] = counts
+	return shared
+
+def packedDice(packedA, packedB, emptyValue=np.nan, dtypePolicy=None):
+	'''
+	2 * |A and B| / (|A| + |B|) for every pair of frames of two packed rolls (see packFrames)
+
+	Output:
+	a timeChunksA x timeChunksB matrix, emptyValue where neither frame has a note on
+	'''
+	featureDtype = rollDtypes.fieldDtype('features', dtypePolicy)
+	shared = packedSharedCounts(packedA, packedB)
+	totalOn = packedOnCounts(packedA)[:, np.newaxis] + packedOnCounts(packedB)[np.newaxis, :]
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		dice = (2 * shared.astype(featureDtype)) / totalOn.astype(featureDtype)
+	dice[totalOn == 0] = emptyValue
+	return dice
+
+def packedJaccard(packedA, packedB, emptyValue=np.nan, dtypePolicy=None):
+	'''
+	|A and B| / |A or B| for every pair of frames of two packed rolls (see packFrames)
+
+	Output:
+	a timeChunksA x timeChunksB matrix, emptyValue where neither frame has a note on
+	'''
+	featureDtype = rollDtypes.fieldDtype('features', dtypePolicy)
+	shared = packedSharedCounts(packedA, packedB)
+	eitherOn = packedOnCounts(packedA)[:, np.newaxis] + packedOnCounts(packedB)[np.newaxis, :] - shared
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		jaccard = shared.astype(featureDtype) / eitherOn.astype(featureDtype)
+	jaccard[eitherOn == 0] = emptyValue
+	return jaccard
+
+def columnSums(mat):
+	if scipy.sparse.issparse(mat):
+		return np.asarray(mat.sum(axis=0), dtype=np.float64).ravel()
+	return np.sum(mat, axis=0, dtype=np.float64)
+
+def sharedNoteCounts(matA, matB, packed=False):
+	'''
+	Count the notes on in both frames for every pair of frames
+
+	Inputs
+	matA, matB: num_notes x timeChunks matrices, dense or scipy.sparse
+	packed: bit-pack dense rolls and count with packedSharedCounts instead of a float32 matrix product
+
+	Output:
+	a timeChunksA x timeChunksB matrix, entry i, j is the number of pitches on in frame i of
+	matA and frame j of matB
+	'''
+	if scipy.sparse.issparse(matA) or scipy.sparse.issparse(matB):
+		onA = scipy.sparse.csc_matrix(matA, dtype=bool).astype(np.float32)
+		onB = scipy.sparse.csc_matrix(matB, dtype=bool).astype(np.float32)
+		return (onA.T @ onB).toarray()
+	matA = np.asarray(matA)
+	matB = np.asarray(matB)
+	if packed:
+		return packedSharedCounts(packFrames(matA), packFrames(matB))
+	# counts are at most 128, so float32 is exact and lets BLAS do the work
+	onA = (matA != 0).astype(np.float32)
+	onB = (matB != 0).astype(np.float32)
+	return onA.T @ onB
+
+def windowedCounts(matA, matB, hopsize, dtypePolicy=None, packed=False):
+	'''
+	Notes on in both windows, and notes on in each window, for every pair of windows of
+	hopsize frames (window i is frames i to i + hopsize - 1)
+
+	Output:
+	sameOn: numWindowsA x numWindowsB matrix of notes on in both windows (summed frame by frame)
+	aOn: total of matA in each of its windows
+	bOn: total of matB in each of its windows
+	'''
+	shared = sharedNoteCounts(matA, matB, packed)
+	sumsA = columnSums(matA)
+	sumsB = columnSums(matB)
+
+	numWindowsA = shared.shape[0] - hopsize + 1
+	numWindowsB = shared.shape[1] - hopsize + 1
+
+	# comparing window i to window j compares frame i + k to frame j + k for every k in the window
+	# float32 counts stay exact far past anything a window can hold
+	featureDtype = rollDtypes.fieldDtype('features', dtypePolicy)
+	sameOn = np.zeros((numWindowsA, numWindowsB), dtype=featureDtype)
+	aOn = np.zeros(numWindowsA, dtype=featureDtype)
+	bOn = np.zeros(numWindowsB, dtype=featureDtype)
+	for k in range(hopsize):
+		sameOn += shared[k:k + numWindowsA, k:k + numWindowsB]
+		aOn += sumsA[k:k + numWindowsA]
+		bOn += sumsB[k:k + numWindowsB]
+
+	return sameOn, aOn, bOn
+
+def windowedDice(matA, matB, hopsize, emptyValue=np.nan, dtypePolicy=None, packed=False):
+	'''
+	2 * sameOn / (aOn + bOn) for every pair of windows (see windowedCounts)
+
+	Inputs
+	matA, matB: num_notes x timeChunks matrices, dense or scipy.sparse
+	hopsize: number of frames in a window
+	emptyValue: what to use when neither window has any notes on
+	dtypePolicy: see rollDtypes.py, the output has its features dtype
+	packed: count the shared notes on bit-packed rolls (see sharedNoteCounts)
+
+	Output:
+	a numWindowsA x numWindowsB matrix, rows are windows of matA and columns windows of matB
+	'''
+	sameOn, aOn, bOn = windowedCounts(matA, matB, hopsize, dtypePolicy, packed)
+	totalOn = aOn[:, np.newaxis] + bOn[np.newaxis, :]
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		dice = (2 * sameOn) / totalOn
+	dice[totalOn == 0] = emptyValue
+	return dice
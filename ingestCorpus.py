@@ -0,0 +1,154 @@
+import argparse
+import json
+import os
+from multiprocessing import Pool
+
+from mido import MidiFile
+
+import corpusCatalog
+import fileHash
+import midiNotes
+import noteStore
+
+'''
+Turn whole directories of MIDI files into note CSVs (the same ones midiToCSV writes)
+and .npy note stores (see noteStore.py), spreading the files over a process pool.
+
+A manifest in the output directory remembers the content hash of every source file
+and where its outputs went, so re-running only processes files that are new or changed.
+Every run also brings the catalog (catalog.sqlite, see corpusCatalog.py) up to date.
+
+ex:
+python ingestCorpus.py Chopin_CSVs/ '../Godowtsai Dataset/Chopin/'
+'''
+
+# bump this when ingestPiece starts recording something new, so old manifest entries get redone
+INGEST_VERSION = 2
+
+def loadManifest(manifestPath):
+	'''
+	Load the manifest of already ingested files, maps source path -> {hash, output, ...}
+	'''
+	if not os.path.exists(manifestPath):
+		return {}
+	with open(manifestPath, 'r') as f:
+		return json.load(f)
+
+def saveManifest(manifestPath, manifest):
+	# write to a temporary file first so an interrupted run can't leave a half written manifest
+	tempPath = manifestPath + '.tmp'
+	with open(tempPath, 'w') as f:
+		json.dump(manifest, f, indent=1, sort_keys=True)
+	os.replace(tempPath, manifestPath)
+
+def ingestPiece(job):
+	'''
+	Pair the notes of one MIDI file and write them out. Runs in a worker process.
+
+	Inputs
+	job: (sourcePath, outFileName, notesFileName)
+
+	Output:
+	a dict with what we learned about the file, which gets stored in the manifest.
+	Files mido can't read get an 'error' entry instead of stopping the whole run.
+	'''
+	(sourcePath, outFileName, notesFileName) = job
+	print('Processing file: %s'%(sourcePath))
+	try:
+		messages = list(MidiFile(sourcePath))
+	except Exception as e:
+		print("Couldn't read %s: %r"%(sourcePath, e))
+		return {'output': None, 'notes': None, 'error': repr(e), 'ingestVersion': INGEST_VERSION}
+	noteonList, unmatchedList = midiNotes.pairNoteEvents(messages)
+	midiNotes.reportUnmatchedNotes(sourcePath, unmatchedList)
+	midiNotes.writeNoteCSV(noteonList, outFileName)
+	noteStore.saveNotes(notesFileName, noteStore.noteListToArray(noteonList))
+
+	result = {'output': outFileName, 'notes': notesFileName, 'numNotes': len(noteonList), 'numUnmatched': len(unmatchedList), 'ingestVersion': INGEST_VERSION}
+	tempos = [msg.tempo for msg in messages if msg.type == 'set_tempo']
+	result.update(corpusCatalog.pieceStatistics(noteonList, tempos))
+	return result
+
+def findMidiFiles(directoriesIn):
+	'''
+	List the MIDI files in each directory, skipping the files macOS leaves around
+	'''
+	midiFiles = []
+	for directory in directoriesIn:
+		for filename in sorted(os.listdir(directory)):
+			if '.DS_Store' in filename or filename.startswith('._'):
+				continue
+			if filename.lower().endswith(('.mid', '.midi')):
+				midiFiles.append(os.path.join(directory, filename))
+	return midiFiles
+
+def ingestCorpus(directoriesIn, directoryOut, manifestPath=None, numWorkers=None, catalogPath=None):
+	'''
+	Write a note CSV and note store for every MIDI file in directoriesIn that changed since the last run
+
+	Inputs
+	directoriesIn: list of directories holding MIDI files
+	directoryOut: directory to write the CSVs and .npy files to (one each per piece, named after the MIDI file)
+	manifestPath: where to keep the manifest, defaults to manifest.json in directoryOut
+	numWorkers: number of processes to use, defaults to the number of cpus
+	catalogPath: the catalog to update, defaults to catalog.sqlite in directoryOut
+
+	Output:
+	the updated manifest
+	'''
+	if manifestPath is None:
+		manifestPath = os.path.join(directoryOut, 'manifest.json')
+	if catalogPath is None:
+		catalogPath = os.path.join(directoryOut, 'catalog.sqlite')
+	if not os.path.isdir(directoryOut):
+		os.makedirs(directoryOut)
+
+	manifest = loadManifest(manifestPath)
+
+	# forget about files that have been deleted since the last run
+	for sourcePath in list(manifest.keys()):
+		if not os.path.exists(sourcePath):
+			del manifest[sourcePath]
+
+	# only hand the pool the files whose contents (or output) changed
+	jobs = []
+	hashes = {}
+	for sourcePath in findMidiFiles(directoriesIn):
+		name = os.path.basename(sourcePath).split('.')
+		outFileName = os.path.join(directoryOut, name[0] + '.csv')
+		notesFileName = os.path.join(directoryOut, name[0] + '.npy')
+		hashes[sourcePath] = fileHash.hashFile(sourcePath)
+
+		# files that failed last time are only retried once their contents change
+		entry = manifest.get(sourcePath)
+		if entry is not None and entry['hash'] == hashes[sourcePath] and entry.get('ingestVersion') == INGEST_VERSION:
+			if 'error' in entry or (entry['output'] == outFileName and os.path.exists(outFileName)
+									and entry.get('notes') == notesFileName and os.path.exists(notesFileName)):
+				continue
+		jobs.append((sourcePath, outFileName, notesFileName))
+
+	print('==> %d files to ingest, %d unchanged'%(len(jobs), len(hashes) - len(jobs)))
+	if jobs:
+		with Pool(numWorkers) as pool:
+			for job, result in zip(jobs, pool.imap(ingestPiece, jobs)):
+				result['hash'] = hashes[job[0]]
+				manifest[job[0]] = result
+				# save as we go, so an interrupted run doesn't redo the files it finished
+				saveManifest(manifestPath, manifest)
+	else:
+		saveManifest(manifestPath, manifest)
+
+	corpusCatalog.updateCatalog(catalogPath, manifest)
+	return manifest
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Convert directories of MIDI files to note CSVs and note stores, skipping files that have not changed.')
+	parser.add_argument('directoryOut', help='directory to write the CSV and .npy files to')
+	parser.add_argument('directoriesIn', nargs='+', help='directories holding MIDI files')
+	parser.add_argument('--manifest', default=None, help='path of the manifest (default: manifest.json in directoryOut)')
+	parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of cpus)')
+	parser.add_argument('--catalog', default=None, help='path of the catalog (default: catalog.sqlite in directoryOut)')
+	args = parser.parse_args()
+
+	ingestCorpus(args.directoriesIn, args.directoryOut, args.manifest, args.workers, args.catalog)
@@ -1,6 +1,11 @@
 import csv
 import numpy as np
 import os
+import midiNotes
+import pianoRoll
+import frameSimilarity
+import rollDtypes
+import artifactCache
 import scipy.io as sp
 import random
 import mido
@@ -23,57 +28,19 @@ def midiToCSV(directoriesIn, directoryOut):
             if '.DS_Store' not in files[i] and '._' not in files[i]:
                 totalFiles = totalFiles + 1
                 print('Processing file %g out of %g in directory: %s'%(i, len(files), files[i]))
-                mid = MidiFile(directory + files[i])
-
-                noteonList = []
-                midimsgList = []
-                accTime = []
-                countNote = 0
-                startTime = 0
-                
-                for msg in mid:
-
-                    # add all messages to list for ease of access
-                    midimsgList.append(msg)
-
-                    # Iterate through all midi message and accumulate time stamps
-                    if accTime == []:
-                        accTime.append(startTime)
-                    else:
-                        accTime.append(msg.time + accTime[-1])
-
-                for j in range(len(midimsgList)):
-                    msg = midimsgList[j]
-
-                    if msg.type == 'note_on' and msg.velocity > 0:
-                        countNote = countNote + 1 # for verification
-
-                        # loop through the message after the j-th message to find corresponding note-off event
-                        for k in range(j+1, len(midimsgList)):
-                            nextmsg = midimsgList[k]
-
-                            # Note: some midi files have no note-off events. Instead, it is note-on event with velocity = 0
-                            if nextmsg.type == 'note_off' or (nextmsg.type == 'note_on' and nextmsg.velocity == 0):
-                                if nextmsg.note == msg.note:
-                                    noteonList.append([msg.note, accTime[j], msg.velocity, accTime[k]-accTime[j]])
-                                    break
-
-                # Check that every note onset gets released
-                if countNote != len(noteonList):
-                    print("Mismatched number of data points. Something is wrong!", countNote, len(noteonList))
-                else:
-                    # Save list of note onsets to csv file
-                    name = files[i].split('.')
-                    outFileName = directoryOut +name[0]+'.csv'
-                    with open(outFileName, 'w') as csvfile:
-                        spamwriter = csv.writer(csvfile, delimiter=',',
-                                        quotechar='|', quoting=csv.QUOTE_MINIMAL)
-                        for row in noteonList:
-                            spamwriter.writerow(row)
-
-def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1):
+                noteonList, unmatchedList = midiNotes.midiFileToNotes(directory + files[i])
+
+                # notes that never get released are reported and left out, the rest of the file is still usable
+                midiNotes.reportUnmatchedNotes(files[i], unmatchedList)
+
+                # Save list of note onsets to csv file
+                name = files[i].split('.')
+                outFileName = directoryOut +name[0]+'.csv'
+                midiNotes.writeNoteCSV(noteonList, outFileName)
+
+def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1, dtypePolicy=None):
 	'''
-	Take a CSV file where row represents a note onset (note, onset_time, velocity, duration)
+	Take a CSV file (or .npy note store, see noteStore.py) where row represents a note onset (note, onset_time, velocity, duration)
 	and convert it into a matrix of size num_notes (128) x timeChunks x 2. The first element in the third
 	dimension will be duration and the second will be velocity
 
@@ -81,85 +48,17 @@ def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1):
 	If onsetOnly is false, the duration and velocity will appear in any time chunks the note is held during
 
 	Inputs
-	filepath: Filepath of the CSV file
+	filepath: Filepath of the CSV file or .npy note store
 	onsetOnly: whether to fill the matrix only at onset, or throughout its duration
 	timePerChunk: how much time each column in the matrix represents
+	dtypePolicy: dtypes of the matrix (see rollDtypes.py), None for the default policy
 
 	Output:
 	a num_notes x timeChunks x 2 (duration and velocity) matrix. 
 	'''
-	numPitches = 128;
-
-	# open your csv file
-	with open(filepath, 'r') as csvfile:
-		print("==> Reading File: %s"%(filepath))
-		myReader = csv.reader(csvfile)
-		# find the max time to figure out how big your matrix should be
-		maxTime = max([float(row[1]) for row in myReader])
-		# reset the reader
-		csvfile.seek(0)
-
-		# open it again to actually parse it, now that you know how big your matrix should be
-		curMatrix = np.zeros((numPitches, int(np.ceil(maxTime / timePerChunk)), 2))
-		
-		# read each row and add into the matrix that represents the song
-		# the csv is in the form: note, time, velocity, duration and has a row for every note onset in the song
-		numNotes = 0
-		for row in myReader:
-			numNotes = numNotes + 1
-			[note, curTime, velocity, duration] = [int(row[0]), float(row[1]), int(row[2]), float(row[3])]
-			
-			# either put an entry just for the onset, or put an entry at every point in its duration
-			if onsetOnly:
-				curMatrix[note, int(np.floor(curTime / timePerChunk)), :] = [duration, velocity]
-			else :
-				# fill in spots after the onset based on the duration
-				# any spot in the matrix it is on during gets turned on
-				curMatrix[note, int(np.floor(curTime / timePerChunk)):int(np.floor((curTime + duration) / timePerChunk)) + 1, :] = [duration, velocity]
-
-	return curMatrix
-
-'''
-Takes in boolean array, returns a row vector containing the index of the lowest
-column containing a value of "True". If there are no True values in the column, the
-value is 0.
-
-Test:
-testMat = np.array([[ True, False, False,  True],
-	   [False, False,  True, False],
-	   [False,  True, False, False]])
-
-print(testMat)
-
-print(oneDimArray(testMat))
-'''
-def generateOneDimArray(logicalMat):
-	arr = np.zeros(logicalMat.shape[1])
-
-	for col in range(logicalMat.shape[1]):
-		for row in range(logicalMat.shape[0]):
-			if logicalMat[row][col]:
-				arr[col] = row
-	return arr
-
-'''
-For a logical matrix, deletes columns where there are zeros in the given array
-
-Test:
-testMat = np.array([[ True, False, False,  True],
-	   [False, False,  True, False],
-	   [False,  True, False, False]])
-
-cols = np.array([0,3,4,0])
-
-out = deleteGivenColumns(testMat, cols)
-print(out)
-'''
-def deleteGivenColumns(logicalMat, columnsToDelete):
-	for i in range(columnsToDelete.shape[0]-1, -1, -1):
-		if columnsToDelete[i] == 0:
-			logicalMat = np.delete(logicalMat, i, 1)
-	return logicalMat
+	# with the artifact cache on, the roll is cached on disk by the contents of the file (see artifactCache.py), so only new or changed files get read
+	print("==> Reading File: %s"%(filepath))
+	return pianoRoll.loadPianoRoll(filepath, onsetOnly, timePerChunk, dtypePolicy)
 
 '''
 Calculates cosimilarity between two logical matrices. True represents
@@ -201,24 +100,12 @@ def findCosimilarityMatrix(mat1, mat2):
 	print(simRows)
 	print(simCols)
 
-	cosimilarityMat = np.empty([simRows,simCols])
-
-	for i in range(simRows):
-		A = mat2[:height, i:i+hopsize]
-		aOn = np.sum(A)
-
-		for j in range(simCols):
-			B = mat1[:height, j:j+hopsize]
-			bOn = np.sum(B)
-
-			sameOn = np.sum(np.logical_and(A,B))
-
-			similarity = (2 * sameOn) / (aOn + bOn)
-
-			cosimilarityMat[i][j] = similarity
-
+	# rows are windows of mat2, columns windows of mat1. Either can be a scipy.sparse roll.
 	# vertically flip because similarity matrices are defined stupidly
-	cosimilarityMat = np.flipud(cosimilarityMat)
+	# (cached on disk by the contents of the matrices when the artifact cache is on, see artifactCache.py)
+	params = {'hopsize': hopsize, 'dtypePolicy': rollDtypes.policyKey()}
+	cosimilarityMat = artifactCache.cachedCall('findCosimilarityMatrix', [mat1, mat2[:height]], params,
+											   lambda: np.flipud(frameSimilarity.windowedDice(mat2[:height], mat1, hopsize)))
 
 	return cosimilarityMat
 
@@ -276,18 +163,20 @@ def findCosimilarityMetric(mat):
 
 
 #midiToCSV(['Midi/'], 'CSV_From_Midi/')
-origMatrix = createMatrixFromCSV('CSV_From_Midi/chpn_op10_e02.csv', True)
+# time resolution of the rolls, the frame times of compactFrames have to use the same one
+timePerChunk = 0.1
+origMatrix = createMatrixFromCSV('CSV_From_Midi/chpn_op10_e02.csv', True, timePerChunk)
 origVelocityOnly = origMatrix[:,:, 1] # pick out just the velocity
 origLogicalMat = origVelocityOnly.astype(bool)
-origOneDimWithZeros = generateOneDimArray(origLogicalMat) # zeros where we want to delete columns
-origOnsetOnly = deleteGivenColumns(origLogicalMat, origOneDimWithZeros)
+# drop the frames with no notes, remembering when the ones that are left happen
+origOnsetOnly, origFrames, origTimes = pianoRoll.compactFrames(origLogicalMat, timePerChunk)
 
 
-godMatrix = createMatrixFromCSV('CSV_From_Midi/godowsky_chopin_etude_10_02_v1_(c)yogore.csv', True)
+godMatrix = createMatrixFromCSV('CSV_From_Midi/godowsky_chopin_etude_10_02_v1_(c)yogore.csv', True, timePerChunk)
 godVelocityOnly = godMatrix[:,:, 1] # pick out just the velocity
 godLogicalMat = godVelocityOnly.astype(bool)
-godOneDimWithZeros = generateOneDimArray(godLogicalMat) # zeros where we want to delete columns
-godOnsetOnly = deleteGivenColumns(godLogicalMat, godOneDimWithZeros)
+# drop the frames with no notes, remembering when the ones that are left happen
+godOnsetOnly, godFrames, godTimes = pianoRoll.compactFrames(godLogicalMat, timePerChunk)
 
 
 # im = Image.fromarray(origVelocityOnly * 2)
@@ -1,6 +1,7 @@
 import csv
 import numpy as np
 import os
+import pianoRoll
 import scipy.io as sp
 import random
 
@@ -12,9 +13,9 @@ from PIL import Image
 
 
 
-def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1):
+def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1, dtypePolicy=None):
 	'''
-	Take a CSV file where row represents a note onset (note, onset_time, velocity, duration)
+	Take a CSV file (or .npy note store, see noteStore.py) where row represents a note onset (note, onset_time, velocity, duration)
 	and convert it into a matrix of size num_notes (128) x timeChunks x 2. The first element in the third
 	dimension will be duration and the second will be velocity
 
@@ -22,43 +23,17 @@ def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1):
 	If onsetOnly is false, the duration and velocity will appear in any time chunks the note is held during
 
 	Inputs
-	filepath: Filepath of the CSV file
+	filepath: Filepath of the CSV file or .npy note store
 	onsetOnly: whether to fill the matrix only at onset, or throughout its duration
 	timePerChunk: how much time each column in the matrix represents
+	dtypePolicy: dtypes of the matrix (see rollDtypes.py), None for the default policy
 
 	Output:
 	a num_notes x timeChunks x 2 (duration and velocity) matrix. 
 	'''
-	numPitches = 128;
-
-	# open your csv file
-	with open(filepath, 'r') as csvfile:
-		print("==> Reading File: %s"%(filepath))
-		myReader = csv.reader(csvfile)
-		# find the max time to figure out how big your matrix should be
-		maxTime = max([float(row[1]) for row in myReader])
-		# reset the reader
-		csvfile.seek(0)
-
-		# open it again to actually parse it, now that you know how big your matrix should be
-		curMatrix = np.zeros((numPitches, int(np.ceil(maxTime / timePerChunk)), 2))
-		
-		# read each row and add into the matrix that represents the song
-		# the csv is in the form: note, time, velocity, duration and has a row for every note onset in the song
-		numNotes = 0
-		for row in myReader:
-			numNotes = numNotes + 1
-			[note, curTime, velocity, duration] = [int(row[0]), float(row[1]), int(row[2]), float(row[3])]
-			
-			# either put an entry just for the onset, or put an entry at every point in its duration
-			if onsetOnly:
-				curMatrix[note, int(np.floor(curTime / timePerChunk)), :] = [duration, velocity]
-			else :
-				# fill in spots after the onset based on the duration
-				# any spot in the matrix it is on during gets turned on
-				curMatrix[note, int(np.floor(curTime / timePerChunk)):int(np.floor((curTime + duration) / timePerChunk)) + 1, :] = [duration, velocity]
-
-	return curMatrix
+	# with the artifact cache on, the roll is cached on disk by the contents of the file (see artifactCache.py), so only new or changed files get read
+	print("==> Reading File: %s"%(filepath))
+	return pianoRoll.loadPianoRoll(filepath, onsetOnly, timePerChunk, dtypePolicy)
 
 
 matrix = createMatrixFromCSV('./Processed/original_MidiFiles.csv', False)
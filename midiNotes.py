@@ -0,0 +1,104 @@
+from mido import Message, MidiFile, MidiTrack
+import numpy as np
+import csv
+
+'''
+Shared MIDI -> note list code. Every copy of midiToCSV used to pair note onsets
+with their releases by scanning forward from each onset, which is O(n^2) in the
+number of messages. pairNoteEvents does the same pairing in one pass.
+
+writeChordMidi goes the other way, for rolls of generated chords (see chordTokens.py).
+'''
+
+def pairNoteEvents(messages):
+	'''
+	Pair every note onset with its release in a single pass over the messages
+
+	Open notes are kept on a stack per (channel, pitch). A release (note_off, or
+	note_on with velocity 0 - some midi files have no note-off events) closes every
+	note that is still open on that channel and pitch, so overlapping onsets of the
+	same pitch all end at the first release after them, like the old forward scan did.
+
+	Inputs
+	messages: midi messages with time in seconds since the previous message
+			  (what you get from iterating over a mido MidiFile)
+
+	Output:
+	noteonList: one row per released note in onset order - [note, onset_time, velocity, duration, channel]
+				(the first four columns are what gets written to the CSV files)
+	unmatchedList: one row per note that never got released - [note, onset_time, velocity, channel]
+	'''
+	noteonList = []
+	openNotes = {}
+	# the first message always starts at 0, the rest accumulate their time stamps
+	accTime = None
+
+	for msg in messages:
+		if accTime is None:
+			accTime = 0
+		else:
+			accTime = msg.time + accTime
+
+		if msg.type == 'note_on' and msg.velocity > 0:
+			# leave the duration empty until we see the release
+			noteonList.append([msg.note, accTime, msg.velocity, None, msg.channel])
+			openNotes.setdefault((msg.channel, msg.note), []).append(len(noteonList) - 1)
+		elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
+			stack = openNotes.get((msg.channel, msg.note))
+			while stack:
+				row = noteonList[stack.pop()]
+				row[3] = accTime - row[1]
+
+	unmatchedList = [[row[0], row[1], row[2], row[4]] for row in noteonList if row[3] is None]
+	noteonList = [row for row in noteonList if row[3] is not None]
+
+	return noteonList, unmatchedList
+
+def midiFileToNotes(filepath):
+	'''
+	Read a midi file and pair up its notes (see pairNoteEvents)
+	'''
+	return pairNoteEvents(MidiFile(filepath))
+
+def reportUnmatchedNotes(filename, unmatchedList):
+	'''
+	Print the notes that never got released, so you can decide whether to trust the file
+	'''
+	if unmatchedList:
+		print("%d notes in %s were never released and were left out:"%(len(unmatchedList), filename))
+		for [note, onsetTime, velocity, channel] in unmatchedList:
+			print("    note %d on channel %d at %f (velocity %d)"%(note, channel, onsetTime, velocity))
+
+def writeNoteCSV(noteonList, outFileName):
+	'''
+	Save a list of note onsets to a csv file, one row per note: note, onset_time, velocity, duration
+	'''
+	with open(outFileName, 'w', newline='') as csvfile:
+		spamwriter = csv.writer(csvfile, delimiter=',',
+						quotechar='|', quoting=csv.QUOTE_MINIMAL)
+		for row in noteonList:
+			spamwriter.writerow(row[:4])
+
+def writeChordMidi(chordRoll, outFileName, stepTicks=80, velocity=60):
+	'''
+	Write a num_notes x timeChunks boolean roll to a midi file, every frame as one chord
+	held for stepTicks (the same step oneDimArrayToMidi in ngrams.py uses). Empty frames are rests.
+	'''
+	mid = MidiFile()
+	track = MidiTrack()
+	mid.tracks.append(track)
+
+	rest = 0
+	for frame in range(chordRoll.shape[1]):
+		pitches = np.flatnonzero(chordRoll[:, frame])
+		if len(pitches) == 0:
+			rest = rest + stepTicks
+			continue
+		# every note of the chord starts together, then they all get released together one step later
+		for i, pitch in enumerate(pitches):
+			track.append(Message('note_on', note=int(pitch), velocity=velocity, time=rest if i == 0 else 0))
+		for i, pitch in enumerate(pitches):
+			track.append(Message('note_on', note=int(pitch), velocity=0, time=stepTicks if i == 0 else 0))
+		rest = 0
+
+	mid.save(outFileName)
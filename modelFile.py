@@ -0,0 +1,145 @@
+import json
+import os
+
+import numpy as np
+import scipy.sparse
+
+'''
+Save trained models (n-gram models, see nGramModel.py, and transition matrices) to one
+binary file of flat arrays that loads with a memory map, so a generation process starts
+without rebuilding anything from the CSVs and worker processes loading the same file
+share its pages instead of each holding a copy.
+
+File layout:
+MAGIC (8 bytes)
+header length (8 bytes, little-endian uint64)
+header: json with the format version, what kind of model it is, its settings, and the
+		dtype, shape and offset of every array
+the arrays, raw, each starting on an ALIGNMENT byte boundary
+
+ex: save the pitch model of the corpus counts and generate from it in another process
+saveNGramModel('NGram_Counts/pitch.model', nGramModel.buildModel(tables))
+model = loadNGramModel('NGram_Counts/pitch.model')
+songs = batchGeneration.generateNGramBatch(model, seeds, 200)
+'''
+
+MAGIC = b'MIRMODEL'
+# bump this when the layout changes, files from newer versions won't load
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+def alignedOffset(offset):
+	return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def writeArrays(filepath, kind, arrays, settings=None):
+	'''
+	Write named arrays to a model file
+
+	Inputs
+	kind: what the arrays make up (ex: 'nGramModel'), checked when loading
+	arrays: dict mapping name -> numpy array
+	settings: dict of anything json can hold that goes with the arrays
+	'''
+	arrays = dict((name, np.ascontiguousarray(array)) for name, array in arrays.items())
+	entries = {}
+	offset = 0
+	for name, array in sorted(arrays.items()):
+		entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+		offset = alignedOffset(offset + array.nbytes)
+	header = json.dumps({'version': FORMAT_VERSION, 'kind': kind, 'settings': settings or {}, 'arrays': entries},
+						sort_keys=True).encode('utf-8')
+	dataStart = alignedOffset(len(MAGIC) + 8 + len(header))
+
+	# write to a temporary file first so a reader can't map a half written model
+	tempPath = filepath + '.tmp'
+	with open(tempPath, 'wb') as f:
+		f.write(MAGIC)
+		f.write(np.uint64(len(header)).astype('<u8').tobytes())
+		f.write(header)
+		for name, array in sorted(arrays.items()):
+			f.seek(dataStart + entries[name]['offset'])
+			f.write(array.tobytes())
+		f.truncate(dataStart + offset)
+	os.replace(tempPath, filepath)
+
+def readArrays(filepath, kind, mmap=True):
+	'''
+	Read the arrays of a model file
+
+	Inputs
+	kind: the kind of model expected in the file
+	mmap: map the file instead of reading it, the arrays are then read-only views of the map
+
+	Output:
+	arrays: dict mapping name -> numpy array
+	settings: the settings saved with them
+	'''
+	with open(filepath, 'rb') as f:
+		if f.read(len(MAGIC)) != MAGIC:
+			raise ValueError('%s is not a model file'%(filepath))
+		headerLength = int(np.frombuffer(f.read(8), dtype='<u8')[0])
+		header = json.loads(f.read(headerLength).decode('utf-8'))
+	if header['version'] > FORMAT_VERSION:
+		raise ValueError('%s is model format version %d, this code only reads up to %d'%(filepath, header['version'], FORMAT_VERSION))
+	if header['kind'] != kind:
+		raise ValueError('%s holds a %s, not a %s'%(filepath, header['kind'], kind))
+
+	dataStart = alignedOffset(len(MAGIC) + 8 + headerLength)
+	if mmap:
+		data = np.memmap(filepath, dtype=np.uint8, mode='r')
+	else:
+		data = np.fromfile(filepath, dtype=np.uint8)
+	arrays = {}
+	for name, entry in header['arrays'].items():
+		dtype = np.dtype(entry['dtype'])
+		count = int(np.prod(entry['shape'], dtype=np.int64))
+		start = dataStart + entry['offset']
+		arrays[name] = data[start:start + count * dtype.itemsize].view(dtype).reshape(entry['shape'])
+	return arrays, header['settings']
+
+def saveNGramModel(filepath, model):
+	'''
+	Save an n-gram model (see nGramModel.py)
+	'''
+	arrays = {'vocabulary': model['vocabulary']}
+	for field in ('contextKeys', 'offsets', 'successors', 'cumulativeCounts'):
+		for k, array in model[field].items():
+			arrays['%s_%d'%(field, k)] = array
+	writeArrays(filepath, 'nGramModel', arrays, {'maxOrder': model['maxOrder']})
+
+def loadNGramModel(filepath, mmap=True):
+	'''
+	Load an n-gram model saved with saveNGramModel
+	'''
+	arrays, settings = readArrays(filepath, 'nGramModel', mmap)
+	maxOrder = settings['maxOrder']
+	model = {'maxOrder': maxOrder, 'vocabulary': arrays['vocabulary']}
+	for field in ('contextKeys', 'offsets', 'successors', 'cumulativeCounts'):
+		model[field] = dict((k, arrays['%s_%d'%(field, k)]) for k in range(1, maxOrder + 1))
+	return model
+
+def saveTransitionModel(filepath, transitionMatrix, notes):
+	'''
+	Save a transition matrix (dense or scipy.sparse) with the note of every column (see batchGeneration.columnNotes)
+	'''
+	if scipy.sparse.issparse(transitionMatrix):
+		transitionMatrix = scipy.sparse.csc_matrix(transitionMatrix)
+		arrays = {'data': transitionMatrix.data, 'indices': transitionMatrix.indices, 'indptr': transitionMatrix.indptr, 'notes': notes}
+		writeArrays(filepath, 'transitionMatrix', arrays, {'sparse': True, 'shape': list(transitionMatrix.shape)})
+	else:
+		writeArrays(filepath, 'transitionMatrix', {'matrix': transitionMatrix, 'notes': notes}, {'sparse': False})
+
+def loadTransitionModel(filepath, mmap=True):
+	'''
+	Load a transition matrix saved with saveTransitionModel
+
+	Output:
+	transitionMatrix: dense array, or scipy.sparse csc matrix if it was saved sparse
+	notes: the note of every column
+	'''
+	arrays, settings = readArrays(filepath, 'transitionMatrix', mmap)
+	if settings['sparse']:
+		transitionMatrix = scipy.sparse.csc_matrix((arrays['data'], arrays['indices'], arrays['indptr']),
+												   shape=tuple(settings['shape']), copy=False)
+		return transitionMatrix, arrays['notes']
+	return arrays['matrix'], arrays['notes']
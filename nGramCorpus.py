@@ -0,0 +1,222 @@
+import argparse
+import os
+import re
+from multiprocessing import Pool
+
+import numpy as np
+
+import fileHash
+import ingestCorpus
+import modelFile
+import nGramCounts
+import nGramModel
+import noteStore
+import pianoRoll
+import transitionMatrix
+import voices
+
+'''
+Pitch and interval n-gram counts over a whole corpus instead of one file. Every piece
+gets counted on its own in a process pool (map), then the per-piece count tables get
+added up (reduce, see nGramCounts.mergeTables).
+
+The per-piece tables are kept in the output directory next to a manifest of the content
+hash of every piece, so adding or changing a piece only counts that piece again and the
+merged tables get rebuilt from the saved ones. Tables of pieces that changed or left the
+corpus get deleted.
+
+ex: interval 2 to 8-grams over every CSV
+python nGramCorpus.py NGram_Counts/ CSV_From_Midi/ --kind interval --orders 2 3 4 5 6 7 8
+
+ex: pitch trigrams of every Chopin etude in the catalog (see corpusCatalog.py)
+paths = [piece['artifacts']['notes'] for piece in corpusCatalog.findPieces(catalogPath, composer='chopin')]
+tables = updateCorpusCounts('NGram_Counts/', paths, [3])
+
+ex: also save an n-gram model of orders 1 to 4 for generating (see nGramModel.py, modelFile.py),
+the orders below the highest one get counted too since the model backs off to them
+python nGramCorpus.py NGram_Counts/ CSV_From_Midi/ --orders 4 --model NGram_Counts/pitch.model
+'''
+
+# bump this when countPiece starts counting differently, so saved per-piece tables get redone
+COUNT_VERSION = 1
+
+def pieceSequence(filepath, kind='pitch', timePerChunk=0.1):
+	'''
+	The sequence to count for one piece: the top voice of its onset roll (what ngrams.py uses),
+	or the intervals between consecutive notes of it
+	'''
+	notes = noteStore.loadNotes(filepath)
+	onsets = pianoRoll.buildFieldRoll(notes, True, timePerChunk, 'velocity', 'compact')
+	melody, frames = voices.extractVoice(onsets, 'top')
+	if kind == 'pitch':
+		return melody
+	if kind == 'interval':
+		return np.diff(melody)
+	raise ValueError("kind has to be 'pitch' or 'interval', not %r"%(kind))
+
+def countPiece(job):
+	'''
+	Count the n-grams of one piece and save its tables. Runs in a worker process.
+
+	Inputs
+	job: (sourcePath, tablePaths, orders, kind, timePerChunk) - tablePaths has one path per order
+
+	Output:
+	dict for the manifest, with an 'error' entry if the piece couldn't be counted
+	'''
+	(sourcePath, tablePaths, orders, kind, timePerChunk) = job
+	print('Counting n-grams of: %s'%(sourcePath))
+	try:
+		sequence = pieceSequence(sourcePath, kind, timePerChunk)
+	except (IOError, ValueError, IndexError) as e:
+		print("Couldn't count %s: %r"%(sourcePath, e))
+		return {'tables': None, 'error': repr(e)}
+
+	for n, tablePath in zip(orders, tablePaths):
+		nGramCounts.saveTable(tablePath, nGramCounts.countNGrams(sequence, n))
+	return {'tables': tablePaths, 'length': len(sequence)}
+
+def pieceTablePath(pieceDirectory, source, sourceHash, kind, n):
+	name = os.path.basename(source).split('.')[0]
+	return os.path.join(pieceDirectory, '%s_%s_%s_%dgrams.npz'%(name, sourceHash[:12], kind, n))
+
+def pruneTables(pieceDirectory, manifest, kind):
+	'''
+	Delete the per-piece tables of one kind that don't belong to a piece in the manifest as it
+	is now (pieces that left the corpus, or older contents of pieces that changed)
+	'''
+	current = tuple('%s_%s_%s_'%(os.path.basename(source).split('.')[0], entry['hash'][:12], kind)
+					for source, entry in manifest.items() if 'error' not in entry)
+	tableName = re.compile(r'_%s_\d+grams\.npz$'%(re.escape(kind)))
+	for filename in os.listdir(pieceDirectory):
+		if tableName.search(filename) and not filename.startswith(current):
+			os.remove(os.path.join(pieceDirectory, filename))
+
+def findNoteFiles(paths):
+	'''
+	Expand directories into the CSVs and .npy note stores in them
+	'''
+	files = []
+	for path in paths:
+		if os.path.isdir(path):
+			for filename in sorted(os.listdir(path)):
+				if filename.endswith(('.csv', '.npy')) and not filename.startswith('._'):
+					files.append(os.path.join(path, filename))
+		else:
+			files.append(path)
+	return files
+
+def updateCorpusCounts(directoryOut, paths, orders, kind='pitch', timePerChunk=0.1, numWorkers=None):
+	'''
+	Bring the corpus counts in directoryOut up to date with the pieces in paths
+
+	Inputs
+	directoryOut: where the per-piece tables, the manifest and the merged tables go
+	paths: note stores, CSVs, or directories of them
+	orders: which n to count
+	kind: 'pitch' or 'interval'
+	timePerChunk: time resolution of the rolls the melodies come from
+	numWorkers: number of processes to use, defaults to the number of cpus
+
+	Output:
+	dict mapping n -> merged count table over every piece (also saved as <kind>_<n>grams.npz)
+	'''
+	pieceDirectory = os.path.join(directoryOut, 'pieces')
+	if not os.path.isdir(pieceDirectory):
+		os.makedirs(pieceDirectory)
+	manifestPath = os.path.join(directoryOut, 'manifest_%s.json'%(kind))
+	manifest = ingestCorpus.loadManifest(manifestPath)
+	settings = {'timePerChunk': timePerChunk, 'countVersion': COUNT_VERSION}
+
+	sources = findNoteFiles(paths)
+	# pieces that aren't part of the corpus anymore just drop out of the merge
+	manifest = dict((source, entry) for source, entry in manifest.items() if source in sources)
+
+	jobs = []
+	hashes = {}
+	for source in sources:
+		hashes[source] = fileHash.hashFile(source)
+		tablePaths = [pieceTablePath(pieceDirectory, source, hashes[source], kind, n) for n in orders]
+
+		entry = manifest.get(source)
+		if entry is not None and entry['hash'] == hashes[source] and entry.get('settings') == settings:
+			if 'error' in entry:
+				continue
+			# already counted, unless some of the orders asked for are new
+			if all(os.path.exists(tablePath) for tablePath in tablePaths):
+				continue
+		jobs.append((source, tablePaths, orders, kind, timePerChunk))
+
+	print('==> %d pieces to count, %d unchanged'%(len(jobs), len(sources) - len(jobs)))
+	if jobs:
+		with Pool(numWorkers) as pool:
+			for job, result in zip(jobs, pool.imap(countPiece, jobs)):
+				result['hash'] = hashes[job[0]]
+				result['settings'] = settings
+				manifest[job[0]] = result
+				ingestCorpus.saveManifest(manifestPath, manifest)
+	else:
+		ingestCorpus.saveManifest(manifestPath, manifest)
+	pruneTables(pieceDirectory, manifest, kind)
+
+	merged = {}
+	for n in orders:
+		tablePaths = [pieceTablePath(pieceDirectory, source, manifest[source]['hash'], kind, n)
+					  for source in sources if 'error' not in manifest[source]]
+		if not tablePaths:
+			continue
+		merged[n] = nGramCounts.mergeTables(nGramCounts.loadTable(tablePath) for tablePath in tablePaths)
+		nGramCounts.saveTable(os.path.join(directoryOut, '%s_%dgrams.npz'%(kind, n)), merged[n])
+	return merged
+
+def addPieceCounts(merged, sequence, orders=None):
+	'''
+	Add one new sequence to already merged tables in memory, without touching the rest of the corpus
+
+	Output:
+	dict mapping n -> updated count table
+	'''
+	if orders is None:
+		orders = list(merged.keys())
+	return dict((n, nGramCounts.mergeTables([merged[n], nGramCounts.countNGrams(sequence, n)]) if n in merged
+				 else nGramCounts.countNGrams(sequence, n)) for n in orders)
+
+def corpusSteadyStates(paths, timePerChunk=0.1, tolerance=1e-12):
+	'''
+	The steady state of the top voice's pitch transitions of every piece, over all 128 pitches
+
+	Inputs
+	paths: CSVs or note stores, or directories of them (see findNoteFiles)
+
+	Output:
+	filepaths: the pieces, in order
+	numPieces x 128 array of steady state distributions
+	'''
+	filepaths = findNoteFiles(paths)
+	pitches = np.arange(128)
+	matrices = np.stack([transitionMatrix.buildTransitionMatrix(pieceSequence(filepath, 'pitch', timePerChunk), pitches)[0]
+						 for filepath in filepaths])
+	return filepaths, transitionMatrix.getSteadyStateDistributions(matrices, tolerance=tolerance)
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Count pitch or interval n-grams over a corpus, only recounting pieces that changed.')
+	parser.add_argument('directoryOut', help='directory to keep the count tables in')
+	parser.add_argument('paths', nargs='+', help='note stores, CSVs, or directories of them')
+	parser.add_argument('--orders', type=int, nargs='+', default=[2, 3, 4], help='which n-grams to count')
+	parser.add_argument('--kind', choices=['pitch', 'interval'], default='pitch', help='count pitches or intervals')
+	parser.add_argument('--time-per-chunk', type=float, default=0.1, help='time resolution of the rolls')
+	parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of cpus)')
+	parser.add_argument('--model', default=None, help='also save an n-gram model of the counts to this model file (counts every order up to the highest one)')
+	args = parser.parse_args()
+
+	orders = args.orders
+	if args.model is not None:
+		# the model backs off through every order below the highest one
+		orders = sorted(set(orders) | set(range(1, max(orders) + 1)))
+	merged = updateCorpusCounts(args.directoryOut, args.paths, orders, args.kind, args.time_per_chunk, args.workers)
+	for n, table in sorted(merged.items()):
+		print('%d-grams: %d distinct, %d total'%(n, len(table['keys']), np.sum(table['counts'])))
+	if args.model is not None:
+		modelFile.saveNGramModel(args.model, nGramModel.buildModel(merged))
+		print('==> Saved n-gram model to %s'%(args.model))
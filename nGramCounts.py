@@ -0,0 +1,217 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+'''
+n-gram counting of any order over a sequence of symbols (the pitches of a melody, the
+intervals between them...) without building a python tuple per window.
+
+Every window of n symbols becomes one key: the symbols are numbered by their place in
+the sorted vocabulary, and the n numbers get packed into one int64 (in base vocabulary
+size) when they fit, or into n big-endian uint16s viewed as one np.void otherwise. Either
+way sorting the keys sorts the n-grams lexicographically, so counting is one np.unique.
+
+A count table is a dict:
+'n': the order
+'vocabulary': sorted array of the symbols, n-grams are stored as indices into it
+'keys': one key per distinct n-gram, sorted (see gramKeys)
+'counts': int64 array, how many times each n-gram was seen
+'''
+
+# biggest key that still fits in an int64
+MAX_PACKED_KEY = 2 ** 63 - 1
+
+def keysArePacked(vocabularySize, n):
+	'''
+	Whether n-grams over a vocabulary this size get packed into int64 keys (or np.void ones)
+	'''
+	return max(vocabularySize, 1) ** n <= MAX_PACKED_KEY
+
+def findSymbols(sequence, vocabulary):
+	'''
+	Look every symbol of the sequence up in the (sorted) vocabulary
+
+	Output:
+	ids: index of every symbol in the vocabulary (some index in range for the ones that aren't in it)
+	found: boolean array, which symbols are in the vocabulary
+	'''
+	sequence = np.asarray(sequence)
+	if len(vocabulary) == 0:
+		return np.zeros(sequence.shape, dtype=np.int64), np.zeros(sequence.shape, dtype=bool)
+	ids = np.minimum(np.searchsorted(vocabulary, sequence), len(vocabulary) - 1).astype(np.int64)
+	return ids, vocabulary[ids] == sequence
+
+def symbolIds(sequence, vocabulary):
+	'''
+	Index of every symbol of the sequence in the (sorted) vocabulary, they all have to be in it
+	'''
+	ids, found = findSymbols(sequence, vocabulary)
+	if not np.all(found):
+		missing = np.unique(np.asarray(sequence)[~found])
+		raise ValueError('%d symbols are missing from the vocabulary, ex: %s'%(len(missing), missing[:5].tolist()))
+	return ids
+
+def gramKeys(idWindows, vocabularySize):
+	'''
+	Turn a k x n array of symbol ids into k keys that sort the same way the rows do
+
+	Output:
+	int64 keys if vocabularySize ** n fits, np.void keys of n big-endian uint16s otherwise
+	'''
+	n = idWindows.shape[1]
+	if keysArePacked(vocabularySize, n):
+		keys = np.zeros(idWindows.shape[0], dtype=np.int64)
+		for i in range(n):
+			keys = keys * max(vocabularySize, 1) + idWindows[:, i]
+		return keys
+	if vocabularySize > np.iinfo(np.uint16).max + 1:
+		raise ValueError('vocabulary of %d symbols is too big for n-gram keys'%(vocabularySize))
+	# big-endian so comparing the bytes compares the ids in order
+	idBytes = np.ascontiguousarray(idWindows, dtype='>u2')
+	return idBytes.view(np.dtype((np.void, 2 * n))).ravel()
+
+def keysToIds(keys, n, vocabularySize):
+	'''
+	Inverse of gramKeys, gives a k x n array of symbol ids
+	'''
+	if keys.dtype.kind == 'V':
+		return np.frombuffer(np.ascontiguousarray(keys).tobytes(), dtype='>u2').reshape(-1, n).astype(np.int64)
+	ids = np.zeros((len(keys), n), dtype=np.int64)
+	remainder = keys.copy()
+	for i in range(n - 1, -1, -1):
+		remainder, ids[:, i] = np.divmod(remainder, max(vocabularySize, 1))
+	return ids
+
+def emptyTable(n, vocabulary):
+	vocabulary = np.asarray(vocabulary)
+	return {'n': n, 'vocabulary': vocabulary, 'keys': gramKeys(np.zeros((0, n), dtype=np.int64), len(vocabulary)),
+			'counts': np.zeros(0, dtype=np.int64)}
+
+def countNGrams(sequence, n, vocabulary=None):
+	'''
+	Count every n-gram (window of n consecutive symbols) of a sequence
+
+	Inputs
+	sequence: 1-d array of symbols (ints, or floats holding whole numbers)
+	n: the order, anything from 1 up
+	vocabulary: sorted symbols to number the n-grams with, defaults to the ones in the sequence
+
+	Output:
+	a count table (see the top of this file)
+	'''
+	sequence = np.asarray(sequence)
+	if vocabulary is None:
+		vocabulary = np.unique(sequence)
+	if len(sequence) < n:
+		return emptyTable(n, vocabulary)
+
+	idWindows = sliding_window_view(symbolIds(sequence, vocabulary), n)
+	keys, counts = np.unique(gramKeys(idWindows, len(vocabulary)), return_counts=True)
+	return {'n': n, 'vocabulary': vocabulary, 'keys': keys, 'counts': counts.astype(np.int64)}
+
+def gramsOf(table, keys=None):
+	'''
+	The n-grams of a count table (or just the given keys of it) as a k x n array of symbols
+	'''
+	if keys is None:
+		keys = table['keys']
+	return table['vocabulary'][keysToIds(keys, table['n'], len(table['vocabulary']))]
+
+def topNGrams(table, k):
+	'''
+	The k most frequent n-grams, most frequent first, without sorting the whole table
+
+	Output:
+	grams: k x n array of symbols
+	counts: how many times each was seen
+	'''
+	k = min(k, len(table['counts']))
+	if k == 0:
+		return gramsOf(table, table['keys'][:0]), table['counts'][:0]
+	top = np.argpartition(-table['counts'], k - 1)[:k]
+	# only the k that made it get sorted (stable, so ties stay in key order)
+	top = np.sort(top)[np.argsort(-table['counts'][np.sort(top)], kind='stable')]
+	return gramsOf(table, table['keys'][top]), table['counts'][top]
+
+def toGramList(table, k=None):
+	'''
+	A count table as the list ngrams.ngrams used to give: ((symbol, symbol, ...), count)
+	tuples, most frequent first. k keeps only the k most frequent.
+	'''
+	grams, counts = topNGrams(table, len(table['counts']) if k is None else k)
+	return [(tuple(gram), int(count)) for gram, count in zip(grams.tolist(), counts)]
+
+def tableFromGramList(gramList, n):
+	'''
+	Inverse of toGramList: a count table from a list of ((symbol, symbol, ...), count) tuples of order n
+	'''
+	grams = np.array([gram for gram, count in gramList]).reshape(-1, n)
+	counts = np.array([count for gram, count in gramList], dtype=np.int64)
+	vocabulary = np.unique(grams)
+	keys = gramKeys(symbolIds(grams, vocabulary).reshape(-1, n), len(vocabulary))
+	order = np.argsort(keys, kind='stable')
+	return {'n': n, 'vocabulary': vocabulary, 'keys': keys[order], 'counts': counts[order]}
+
+def renumberTable(table, vocabulary):
+	'''
+	The keys of a count table renumbered against a bigger (sorted) vocabulary
+	'''
+	n = table['n']
+	return gramKeys(symbolIds(gramsOf(table), vocabulary).reshape(-1, n), len(vocabulary))
+
+def sumByKey(keys, counts):
+	'''
+	Add up the counts of equal keys, gives sorted unique keys and their totals
+	'''
+	keys, inverse = np.unique(keys, return_inverse=True)
+	totals = np.zeros(len(keys), dtype=np.int64)
+	np.add.at(totals, inverse.ravel(), counts)
+	return keys, totals
+
+def mergeTables(tables):
+	'''
+	Add up count tables of the same order (ex: one per piece) into one table over the
+	union of their vocabularies
+	'''
+	tables = list(tables)
+	n = tables[0]['n']
+	if any(table['n'] != n for table in tables):
+		raise ValueError('can only merge count tables of the same order')
+	vocabulary = np.unique(np.concatenate([table['vocabulary'] for table in tables]))
+
+	# renumber every table's n-grams against the merged vocabulary, then add up the counts of equal keys
+	keys, counts = sumByKey(np.concatenate([renumberTable(table, vocabulary) for table in tables]),
+							np.concatenate([table['counts'] for table in tables]))
+	return {'n': n, 'vocabulary': vocabulary, 'keys': keys, 'counts': counts}
+
+def suffixTable(table, k):
+	'''
+	Approximate k-gram counts (k < n) from an n-gram table, by counting the last k symbols of
+	every n-gram. Only the k-grams in the first n - k windows of the sequence are missing.
+	'''
+	ids = keysToIds(table['keys'], table['n'], len(table['vocabulary']))[:, table['n'] - k:]
+	keys, counts = sumByKey(gramKeys(np.ascontiguousarray(ids), len(table['vocabulary'])), table['counts'])
+	return {'n': k, 'vocabulary': table['vocabulary'], 'keys': keys, 'counts': counts}
+
+def prefixTable(table, k, lastWindow=None):
+	'''
+	k-gram counts (k < n) from an n-gram table by counting the first k symbols of every
+	n-gram, with no pass over the sequence. Only the k-grams in the last n - k windows of the
+	sequence are missing; give the last k symbols as lastWindow when k = n - 1 and the counts
+	are exact.
+	'''
+	vocabularySize = len(table['vocabulary'])
+	ids = keysToIds(table['keys'], table['n'], vocabularySize)[:, :k]
+	keys = gramKeys(np.ascontiguousarray(ids), vocabularySize)
+	counts = table['counts']
+	if lastWindow is not None and len(lastWindow) == k:
+		keys = np.concatenate([keys, gramKeys(symbolIds(lastWindow, table['vocabulary']).reshape(1, k), vocabularySize)])
+		counts = np.append(counts, 1)
+	keys, counts = sumByKey(keys, counts)
+	return {'n': k, 'vocabulary': table['vocabulary'], 'keys': keys, 'counts': counts}
+
+def saveTable(filepath, table):
+	np.savez(filepath, n=table['n'], vocabulary=table['vocabulary'], keys=table['keys'], counts=table['counts'])
+
+def loadTable(filepath):
+	with np.load(filepath) as f:
+		return {'n': int(f['n']), 'vocabulary': f['vocabulary'], 'keys': f['keys'], 'counts': f['counts']}
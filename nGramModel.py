@@ -0,0 +1,232 @@
+import numpy as np
+
+import nGramCounts
+
+'''
+All the orders 1..N of an n-gram model in a handful of flat arrays, with backoff. When
+the last N-1 symbols were never seen as a context, the query falls back to the last N-2,
+and so on down to the unigrams, which always have something, so generation never has to
+stop early.
+
+For every order k the n-grams are kept sorted by their key (see nGramCounts.gramKeys), so
+the ones sharing a context (their first k-1 symbols) sit next to each other:
+contextKeys[k]: sorted key of each distinct context of order k (the only order 1 context is the empty one)
+offsets[k]: contexts i's successors are successors[k][offsets[k][i]:offsets[k][i + 1]]
+successors[k]: id (index into the vocabulary) of the last symbol of each n-gram
+cumulativeCounts[k]: running count of the successors, starting over at each context
+
+Finding a context is one hash lookup of its packed key, and a draw is one binary search
+of its slice of cumulativeCounts with a single random number. The hash index (packed
+context key -> context row) of an order is a plain dict built from contextKeys the first
+time that order is queried, so only the orders generation actually reaches pay for it and
+saved models (see modelFile.py) stay flat arrays. The n-grams themselves are a few bytes
+each instead of a few python objects. batchGeneration looks up whole batches of contexts
+with one binary search of contextKeys per order instead.
+
+A model is a dict:
+'maxOrder': N
+'vocabulary': sorted array of the symbols
+'contextKeys', 'offsets', 'successors', 'cumulativeCounts': dicts mapping k -> array as above
+'contextRows': dict mapping k -> hash index of that order, filled in by contextIndex as needed
+'''
+
+# how much a lower order's score counts for each step of backing off (stupid backoff, Brants et al. 2007)
+BACKOFF_WEIGHT = 0.4
+
+def orderArrays(table):
+	'''
+	The contextKeys, offsets, successors and cumulativeCounts of one order from its count table
+	'''
+	k = table['n']
+	vocabularySize = len(table['vocabulary'])
+	ids = nGramCounts.keysToIds(table['keys'], k, vocabularySize)
+	counts = table['counts']
+
+	# the table's keys are sorted, so all the n-grams with the same context are next to each other
+	gramContexts = nGramCounts.gramKeys(np.ascontiguousarray(ids[:, :-1]), vocabularySize)
+	newContext = np.ones(len(gramContexts), dtype=bool)
+	newContext[1:] = gramContexts[1:] != gramContexts[:-1]
+	starts = np.flatnonzero(newContext)
+	offsets = np.append(starts, len(gramContexts)).astype(np.int64)
+
+	# running count within each context: the overall running count minus what came before the context
+	runningCounts = np.cumsum(counts)
+	before = np.repeat(runningCounts[starts] - counts[starts], np.diff(offsets))
+	return gramContexts[starts], offsets, ids[:, -1].astype(np.int32), runningCounts - before
+
+def buildModel(tables):
+	'''
+	Build a model from count tables of orders 1..N (a list, or a dict mapping n -> table).
+	The tables don't need to share a vocabulary.
+	'''
+	if isinstance(tables, dict):
+		tables = list(tables.values())
+	tables = dict((table['n'], table) for table in tables)
+	maxOrder = max(tables)
+	if sorted(tables) != list(range(1, maxOrder + 1)):
+		raise ValueError('need count tables for every order from 1 to %d, got %s'%(maxOrder, sorted(tables)))
+
+	vocabulary = np.unique(np.concatenate([table['vocabulary'] for table in tables.values()]))
+	model = {'maxOrder': maxOrder, 'vocabulary': vocabulary,
+			 'contextKeys': {}, 'offsets': {}, 'successors': {}, 'cumulativeCounts': {}}
+	for k, table in tables.items():
+		keys, counts = nGramCounts.sumByKey(nGramCounts.renumberTable(table, vocabulary), table['counts'])
+		(model['contextKeys'][k], model['offsets'][k],
+		 model['successors'][k], model['cumulativeCounts'][k]) = orderArrays(
+			{'n': k, 'vocabulary': vocabulary, 'keys': keys, 'counts': counts})
+	return model
+
+def modelFromSequence(sequence, maxOrder):
+	'''
+	Build a model with every order from 1 to maxOrder from one pass over a sequence: only
+	the maxOrder-grams get counted from the windows, and every lower order k comes from the
+	first k symbols of the order above it plus the one k-gram at the very end of the
+	sequence that no (k+1)-gram starts (see nGramCounts.prefixTable)
+	'''
+	sequence = np.asarray(sequence)
+	vocabulary = np.unique(sequence)
+	tables = [nGramCounts.countNGrams(sequence, maxOrder, vocabulary)]
+	for k in range(maxOrder - 1, 0, -1):
+		if len(sequence) <= k:
+			# too short for any (k+1)-gram, there's at most the one window to count
+			tables.append(nGramCounts.countNGrams(sequence, k, vocabulary))
+		else:
+			tables.append(nGramCounts.prefixTable(tables[-1], k, sequence[len(sequence) - k:]))
+	return buildModel(tables)
+
+def modelFromGramList(gramList, n):
+	'''
+	Build a model from a list of ((symbol, symbol, ...), count) tuples of order n (what ngrams.ngrams gives).
+	The lower orders to back off to are counted from the ends of the n-grams (see nGramCounts.suffixTable).
+	'''
+	table = nGramCounts.tableFromGramList(gramList, n)
+	return buildModel([nGramCounts.suffixTable(table, k) for k in range(1, n)] + [table])
+
+def truncateModel(model, maxOrder):
+	'''
+	The same model with only orders 1..maxOrder (no copying, the arrays are shared)
+	'''
+	if maxOrder > model['maxOrder']:
+		raise ValueError('model only goes up to order %d, not %d'%(model['maxOrder'], maxOrder))
+	# the hash indexes are shared too, orders 1..maxOrder are the same arrays
+	truncated = {'maxOrder': maxOrder, 'vocabulary': model['vocabulary'], 'contextRows': model.setdefault('contextRows', {})}
+	for field in ('contextKeys', 'offsets', 'successors', 'cumulativeCounts'):
+		truncated[field] = dict((k, model[field][k]) for k in range(1, maxOrder + 1))
+	return truncated
+
+def historyIds(model, history):
+	'''
+	The ids of the last maxOrder-1 symbols of history, and how many of them (counting back
+	from the end) are in the vocabulary. A context can't reach back past an unknown symbol.
+	'''
+	history = np.asarray(history)[len(history) - min(len(history), model['maxOrder'] - 1):]
+	vocabulary = model['vocabulary']
+	if len(vocabulary) == 0:
+		return np.zeros(0, dtype=np.int64), 0
+	ids, found = nGramCounts.findSymbols(history, vocabulary)
+	unknown = np.flatnonzero(~found)
+	usable = len(history) if len(unknown) == 0 else len(history) - 1 - unknown[-1]
+	return ids, usable
+
+def contextRows(model, k):
+	'''
+	Hash index of the contexts of order k: dict mapping packed context key -> context row
+	(python ints, or bytes for np.void keys), built on first use
+	'''
+	rows = model.setdefault('contextRows', {})
+	if k not in rows:
+		rows[k] = dict(zip(model['contextKeys'][k].tolist(), range(len(model['contextKeys'][k]))))
+	return rows[k]
+
+def contextIndex(model, k, contextIds):
+	'''
+	Which context of order k the k-1 ids are, -1 if the model never saw it
+	'''
+	key = nGramCounts.gramKeys(contextIds.reshape(1, k - 1), len(model['vocabulary']))[0]
+	return contextRows(model, k).get(key.item(), -1)
+
+def findContext(model, history):
+	'''
+	The longest context at the end of history that the model has seen, backing off one
+	symbol at a time down to the empty (unigram) context
+
+	Output:
+	order: the order of the n-grams the context belongs to (context length + 1), 0 if the model is empty
+	index: which context of that order it is
+	'''
+	ids, usable = historyIds(model, history)
+	for k in range(min(usable + 1, model['maxOrder']), 0, -1):
+		index = contextIndex(model, k, ids[len(ids) - (k - 1):])
+		if index >= 0:
+			return k, index
+	return 0, 0
+
+def successorsOf(model, order, index):
+	'''
+	Successor ids and their running counts for one context
+	'''
+	start, end = model['offsets'][order][index], model['offsets'][order][index + 1]
+	return model['successors'][order][start:end], model['cumulativeCounts'][order][start:end]
+
+def backoffScores(model, history, backoffWeight=BACKOFF_WEIGHT):
+	'''
+	Stupid backoff score of every symbol of the vocabulary following history: its relative
+	frequency after the longest seen context, or backoffWeight times its score one order
+	down if it never followed that context
+
+	Output:
+	array of scores, one per symbol of model['vocabulary']
+	'''
+	scores = np.zeros(len(model['vocabulary']))
+	scored = np.zeros(len(model['vocabulary']), dtype=bool)
+	ids, usable = historyIds(model, history)
+	weight = 1.0
+	# one pass from the longest context down, each symbol keeps the score of the first order it shows up in
+	for k in range(min(usable + 1, model['maxOrder']), 0, -1):
+		index = contextIndex(model, k, ids[len(ids) - (k - 1):])
+		if index >= 0:
+			successors, cumulativeCounts = successorsOf(model, k, index)
+			new = ~scored[successors]
+			scores[successors[new]] = weight * np.diff(cumulativeCounts, prepend=0)[new] / cumulativeCounts[-1]
+			scored[successors] = True
+		weight *= backoffWeight
+	return scores
+
+def drawNext(model, history, rng):
+	'''
+	Draw the symbol after history from the longest context of it the model has seen,
+	weighted by how often each symbol followed that context
+
+	Output:
+	the next symbol, or None if the model is empty
+	'''
+	order, index = findContext(model, history)
+	if order == 0:
+		return None
+	successors, cumulativeCounts = successorsOf(model, order, index)
+	# one random number picks the whole n-gram
+	return model['vocabulary'][successors[np.searchsorted(cumulativeCounts, rng.random() * cumulativeCounts[-1], side='right')]].item()
+
+def generate(model, seed, numSteps, rng=None):
+	'''
+	Generate a sequence by repeatedly drawing the next symbol after the last maxOrder-1,
+	backing off to shorter contexts when they were never seen
+
+	Inputs
+	seed: the first symbols, only the last maxOrder-1 matter for the first draw
+	numSteps: how many symbols to draw after the seed
+	rng: numpy random Generator, defaults to a fresh one
+
+	Output:
+	array with the seed followed by numSteps drawn symbols (always the full length unless the model is empty)
+	'''
+	if rng is None:
+		rng = np.random.default_rng()
+	sequence = list(seed)
+	contextLength = model['maxOrder'] - 1
+	for i in range(numSteps):
+		nextSymbol = drawNext(model, sequence[len(sequence) - min(len(sequence), contextLength):], rng)
+		if nextSymbol is None:
+			break
+		sequence.append(nextSymbol)
+	return np.array(sequence)
@@ -0,0 +1,92 @@
+import argparse
+import os
+
+import numpy as np
+
+'''
+Binary note store. A piece is a numpy structured array with one entry per note,
+saved as a .npy file so it can be memory-mapped back in without parsing anything.
+
+Fields:
+onset: time of the note onset in seconds
+duration: how long the note is held in seconds
+pitch: midi note number
+velocity: midi velocity
+track: midi channel the note was played on (the merged message stream doesn't keep
+	   track numbers, and in the Godowtsai files each track plays on its own channel)
+
+To convert a directory of the existing CSVs:
+python noteStore.py CSV_From_Midi/ Notes_From_Midi/
+'''
+
+# aligned so the float fields can be used in place straight out of a memory map
+NOTE_DTYPE = np.dtype([('onset', np.float64), ('duration', np.float64),
+					   ('pitch', np.uint8), ('velocity', np.uint8), ('track', np.uint8)], align=True)
+
+def noteListToArray(noteonList):
+	'''
+	Turn rows of [note, onset_time, velocity, duration] (plus channel, if there is a
+	fifth column like midiNotes.pairNoteEvents gives you) into a note array
+	'''
+	notes = np.zeros(len(noteonList), dtype=NOTE_DTYPE)
+	for i, row in enumerate(noteonList):
+		notes[i] = (row[1], row[3], row[0], row[2], row[4] if len(row) > 4 else 0)
+	return notes
+
+def csvToNotes(filepath):
+	'''
+	Parse a CSV in the form note, onset_time, velocity, duration (one row per note onset)
+	into a note array. Tracks aren't in the CSVs, so they're all 0.
+	'''
+	table = np.loadtxt(filepath, delimiter=',', ndmin=2)
+	notes = np.zeros(table.shape[0], dtype=NOTE_DTYPE)
+	if table.shape[0] > 0:
+		notes['pitch'] = table[:, 0]
+		notes['onset'] = table[:, 1]
+		notes['velocity'] = table[:, 2]
+		notes['duration'] = table[:, 3]
+	return notes
+
+def saveNotes(filepath, notes):
+	np.save(filepath, np.asarray(notes, dtype=NOTE_DTYPE))
+
+def loadNotes(filepath, mmap=True):
+	'''
+	Load the notes of a piece
+
+	Inputs
+	filepath: a .npy note store, or a CSV (which gets parsed, so prefer the .npy)
+	mmap: memory-map .npy files instead of reading them in. The array is read-only then.
+
+	Output:
+	a note array with dtype NOTE_DTYPE. The fields (notes['onset'] etc.) are views, not copies.
+	'''
+	if filepath.endswith('.npy'):
+		notes = np.load(filepath, mmap_mode='r' if mmap else None)
+		if notes.dtype != NOTE_DTYPE:
+			raise ValueError('%s is not a note store (dtype %s)'%(filepath, notes.dtype))
+		return notes
+	return csvToNotes(filepath)
+
+def convertCSVDirectory(directoryIn, directoryOut):
+	'''
+	Write a .npy note store next to every CSV in directoryIn (into directoryOut)
+	'''
+	if not os.path.isdir(directoryOut):
+		os.makedirs(directoryOut)
+
+	files = sorted(os.listdir(directoryIn))
+	for i in range(len(files)):
+		if files[i].endswith('.csv') and not files[i].startswith('._'):
+			print('Converting file %g out of %g in directory: %s'%(i, len(files), files[i]))
+			outFileName = os.path.join(directoryOut, files[i][:-len('.csv')] + '.npy')
+			saveNotes(outFileName, csvToNotes(os.path.join(directoryIn, files[i])))
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Convert a directory of note CSVs to .npy note stores.')
+	parser.add_argument('directoryIn', help='directory holding the CSV files')
+	parser.add_argument('directoryOut', help='directory to write the .npy files to')
+	args = parser.parse_args()
+
+	convertCSVDirectory(args.directoryIn, args.directoryOut)
@@ -0,0 +1,214 @@
+import numpy as np
+import scipy.sparse
+
+import artifactCache
+import noteStore
+import rollDtypes
+
+'''
+Piano roll construction shared by every copy of createMatrixFromCSV.
+
+A roll is a num_notes (128) x timeChunks x 2 matrix. The first element in the third
+dimension is the duration of the note and the second is its velocity.
+
+Rolls are almost all zeros, so there is also a sparse version: one num_notes x timeChunks
+scipy.sparse CSC matrix (a column per time chunk) holding either the velocity or the
+duration. similarity, findCosimilarityMatrix, getSamplesFromSong and costAndOnsetsToMIDI
+all take these as well as dense matrices.
+
+The dtypes of the rolls follow a policy (see rollDtypes.py). Under the 'quantized' policy
+durations are stored in ticks of rollDtypes.DURATION_STEP, rollDtypes.decodeDurations turns
+them back into seconds.
+'''
+
+NUM_PITCHES = 128
+
+def rollCells(notes, onsetOnly, timePerChunk):
+	'''
+	Work out which cells of the roll each note fills, without looping over the notes
+
+	Output:
+	numChunks: number of time chunks in the roll
+	cells: flat index (pitch * numChunks + chunk) of every filled cell, each cell once
+	noteOfCell: index of the note whose values go in that cell. When several notes cover
+				the same cell it's the later one, like writing them one at a time did.
+	'''
+	pitch = notes['pitch'].astype(np.intp)
+	onset = np.asarray(notes['onset'], dtype=np.float64)
+	duration = np.asarray(notes['duration'], dtype=np.float64)
+
+	# find the max time to figure out how big your matrix should be
+	maxTime = np.max(onset)
+	numChunks = int(np.ceil(maxTime / timePerChunk))
+
+	start = np.floor(onset / timePerChunk).astype(np.intp)
+
+	if onsetOnly:
+		# the last note onset of a piece lands one past the end when maxTime is a multiple of timePerChunk
+		if np.any(start >= numChunks):
+			raise IndexError('note onset at %f is past the end of the matrix (%d chunks)'%(maxTime, numChunks))
+		end = start + 1
+	else:
+		# any spot in the matrix the note is on during gets turned on (clipped like slicing would)
+		end = np.floor((onset + duration) / timePerChunk).astype(np.intp) + 1
+		start = np.minimum(start, numChunks)
+		end = np.minimum(end, numChunks)
+	lengths = np.maximum(end - start, 0)
+
+	# expand every note into the cells it covers: a cumsum over the span lengths gives where each
+	# note's run of cells starts, and a running index minus that start gives the offset inside the run
+	runStarts = np.cumsum(lengths) - lengths
+	noteOfCell = np.repeat(np.arange(len(lengths)), lengths)
+	cells = np.arange(np.sum(lengths)) - runStarts[noteOfCell] + (pitch * numChunks + start)[noteOfCell]
+
+	# when several notes cover the same cell the later one wins
+	_, lastFromEnd = np.unique(cells[::-1], return_index=True)
+	keep = len(cells) - 1 - lastFromEnd
+
+	return numChunks, cells[keep], noteOfCell[keep]
+
+def buildPianoRoll(notes, onsetOnly, timePerChunk=0.1, dtypePolicy=None):
+	'''
+	Build the piano roll of a piece from its note array (see noteStore.py) without
+	looping over the notes in python. Gives exactly what the old note by note loop did,
+	including which note wins when two of them land in the same cell (the later one).
+
+	Inputs
+	notes: note array, with onset, duration, pitch and velocity fields
+	onsetOnly: whether to fill the matrix only at onset, or throughout its duration
+	timePerChunk: how much time each column in the matrix represents
+	dtypePolicy: see rollDtypes.py, both fields share the smallest dtype they fit in
+				 (float32 for 'compact', uint16 for 'quantized')
+
+	Output:
+	a num_notes x timeChunks x 2 (duration and velocity) matrix.
+	'''
+	numChunks, cells, noteOfCell = rollCells(notes, onsetOnly, timePerChunk)
+
+	curMatrix = np.zeros((NUM_PITCHES, numChunks, 2), dtype=rollDtypes.rollDtype(dtypePolicy))
+	curMatrix.reshape(-1, 2)[cells, 0] = rollDtypes.encodeDurations(notes['duration'][noteOfCell], dtypePolicy)
+	curMatrix.reshape(-1, 2)[cells, 1] = rollDtypes.encodeVelocities(notes['velocity'][noteOfCell], dtypePolicy)
+
+	return curMatrix
+
+def fieldValues(notes, noteOfCell, field, dtypePolicy):
+	if field == 'duration':
+		return rollDtypes.encodeDurations(notes['duration'][noteOfCell], dtypePolicy)
+	if field == 'velocity':
+		return rollDtypes.encodeVelocities(notes['velocity'][noteOfCell], dtypePolicy)
+	raise ValueError("field has to be 'velocity' or 'duration', not %r"%(field))
+
+def loadPianoRoll(filepath, onsetOnly, timePerChunk=0.1, dtypePolicy=None):
+	'''
+	buildPianoRoll of a .npy note store or CSV. When the artifact cache is turned on it's
+	cached on disk by the contents of the file (see artifactCache.py) so it's only built once
+	'''
+	params = {'onsetOnly': bool(onsetOnly), 'timePerChunk': timePerChunk, 'dtypePolicy': rollDtypes.policyKey(dtypePolicy)}
+	return artifactCache.cachedCall('buildPianoRoll', [filepath], params,
+									lambda: buildPianoRoll(noteStore.loadNotes(filepath), onsetOnly, timePerChunk, dtypePolicy))
+
+def buildFieldRoll(notes, onsetOnly, timePerChunk=0.1, field='velocity', dtypePolicy=None):
+	'''
+	One field of buildPianoRoll as a num_notes x timeChunks matrix, in that field's own dtype
+	(ex: uint8 velocities under the 'compact' policy are 16x smaller than the float64 roll)
+
+	Inputs
+	notes, onsetOnly, timePerChunk, dtypePolicy: same as buildPianoRoll
+	field: which value to put in the cells, 'velocity' or 'duration'
+	'''
+	numChunks, cells, noteOfCell = rollCells(notes, onsetOnly, timePerChunk)
+
+	values = fieldValues(notes, noteOfCell, field, dtypePolicy)
+	roll = np.zeros((NUM_PITCHES, numChunks), dtype=values.dtype)
+	roll.reshape(-1)[cells] = values
+	return roll
+
+def buildSparseRoll(notes, onsetOnly, timePerChunk=0.1, field='velocity', dtypePolicy=None):
+	'''
+	Sparse version of buildFieldRoll, memory scales with the number of filled cells instead of
+	128 x timeChunks
+
+	Inputs
+	notes, onsetOnly, timePerChunk, dtypePolicy: same as buildPianoRoll
+	field: which value to put in the cells, 'velocity' or 'duration'
+
+	Output:
+	a num_notes x timeChunks scipy.sparse CSC matrix, equal to buildPianoRoll(...)[:, :, 1]
+	for velocity (or [:, :, 0] for duration)
+	'''
+	numChunks, cells, noteOfCell = rollCells(notes, onsetOnly, timePerChunk)
+
+	roll = scipy.sparse.csc_matrix((fieldValues(notes, noteOfCell, field, dtypePolicy), (cells // numChunks, cells % numChunks)),
+								   shape=(NUM_PITCHES, numChunks))
+	# zero length notes would otherwise leave explicit zeros behind
+	roll.eliminate_zeros()
+	return roll
+
+def toSparseRoll(mat):
+	'''
+	Turn a dense num_notes x timeChunks matrix (ex: the velocity slice of a roll) into a sparse CSC one
+	'''
+	if scipy.sparse.issparse(mat):
+		return mat.tocsc()
+	return scipy.sparse.csc_matrix(mat)
+
+def activePitches(mat, frame):
+	'''
+	Pitches that are on (> 0) in one time chunk of a dense or sparse CSC num_notes x timeChunks matrix
+	'''
+	if scipy.sparse.issparse(mat):
+		mat = mat.tocsc()
+		startIndex, endIndex = mat.indptr[frame], mat.indptr[frame + 1]
+		return np.sort(mat.indices[startIndex:endIndex][mat.data[startIndex:endIndex] > 0])
+	return np.flatnonzero(mat[:, frame] > 0)
+
+def compactFrames(mat, timePerChunk, keep=None):
+	'''
+	Drop frames (time chunks) of a roll in one boolean mask gather, keeping track of where
+	the frames that are left came from
+
+	Inputs
+	mat: num_notes x timeChunks (or num_notes x timeChunks x 2) matrix, dense or scipy.sparse
+	timePerChunk: how much time each frame represents, the same as the roll was built with
+	keep: boolean array, which frames to keep. Defaults to the frames that have a note on.
+
+	Output:
+	compacted: mat with only the kept frames
+	frames: int array, the original index of each kept frame
+	times: the start time of each kept frame in seconds
+	'''
+	if keep is None:
+		if scipy.sparse.issparse(mat):
+			keep = np.asarray((mat != 0).sum(axis=0)).ravel() > 0
+		else:
+			keep = np.asarray(mat).reshape(mat.shape[0], mat.shape[1], -1).any(axis=(0, 2))
+	frames = np.flatnonzero(keep)
+	if scipy.sparse.issparse(mat):
+		compacted = mat.tocsc()[:, frames]
+	else:
+		compacted = mat[:, frames]
+	return compacted, frames, frames * timePerChunk
+
+def pathTimes(path, timesOne, timesTwo):
+	'''
+	The time in seconds of every step of a DTW path between two compacted rolls
+
+	Inputs
+	path: 2 x numSteps array, row 0 the frames of piece two and row 1 the frames of piece one
+		  (the rows and columns of a findCosimilarityMatrix cost matrix once it's flipped right side up)
+	timesOne, timesTwo: start time of each frame of the two pieces (see compactFrames)
+
+	Output:
+	secondsOne, secondsTwo: the time in piece one and in piece two of every step
+	'''
+	path = np.asarray(path, dtype=np.intp)
+	return np.asarray(timesOne)[path[1]], np.asarray(timesTwo)[path[0]]
+
+def stepTicks(seconds, ticksPerBeat, tempo=500000, lastTicks=80):
+	'''
+	How many midi ticks each step lasts when it runs until the time of the next step.
+	A time that goes backwards gives 0 ticks, and the last step gets lastTicks.
+	'''
+	ticks = np.full(len(seconds), lastTicks, dtype=np.int64)
+	ticks[:-1] = np.maximum(np.rint(np.diff(seconds) * ticksPerBeat * 1e6 / tempo), 0)
+	return ticks
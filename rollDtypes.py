@@ -0,0 +1,95 @@
+import numpy as np
+
+'''
+dtype policy for piano rolls and everything derived from them (patch samples,
+similarity matrices). A float64 roll of a 10 minute piece at 0.01s resolution is
+hundreds of MB, while velocities fit in a byte and durations don't need 15 digits.
+
+Policies:
+'float64': everything float64, what the code always did (the default)
+'compact': uint8 velocity, float32 duration, float32 features
+'quantized': uint8 velocity, uint16 duration in DURATION_STEP ticks, float32 features
+
+Functions that take a dtypePolicy accept a policy name, a policy dict, or None for
+the default. To switch a whole run over:
+rollDtypes.setDefaultPolicy('compact')
+'''
+
+# quantized durations count in milliseconds, so they top out at 65.535 seconds
+DURATION_STEP = 0.001
+
+POLICIES = {
+	'float64': {'velocity': np.float64, 'duration': np.float64, 'features': np.float64},
+	'compact': {'velocity': np.uint8, 'duration': np.float32, 'features': np.float32},
+	'quantized': {'velocity': np.uint8, 'duration': np.uint16, 'features': np.float32},
+}
+
+defaultPolicy = 'float64'
+
+def setDefaultPolicy(policy):
+	'''
+	Set the policy used when a function is given dtypePolicy=None
+	'''
+	global defaultPolicy
+	getPolicy(policy)
+	defaultPolicy = policy
+
+def getPolicy(policy=None):
+	'''
+	Look up a policy
+
+	Output:
+	dict with the 'velocity', 'duration' and 'features' dtypes
+	'''
+	if policy is None:
+		policy = defaultPolicy
+	if isinstance(policy, dict):
+		return policy
+	if policy not in POLICIES:
+		raise ValueError('unknown dtype policy %r, expected one of %s'%(policy, ', '.join(sorted(POLICIES))))
+	return POLICIES[policy]
+
+def policyKey(policy=None):
+	'''
+	A policy as a json-able dict of dtype strings (ex: '<f8'), for cache keys (see artifactCache.py)
+	'''
+	return dict((field, np.dtype(dtype).str) for field, dtype in getPolicy(policy).items())
+
+def fieldDtype(field, policy=None):
+	'''
+	dtype of the 'velocity', 'duration' or 'features' matrices under a policy
+	'''
+	return np.dtype(getPolicy(policy)[field])
+
+def rollDtype(policy=None):
+	'''
+	dtype of a combined duration and velocity roll: the smallest one both fit in
+	'''
+	return np.result_type(fieldDtype('duration', policy), fieldDtype('velocity', policy))
+
+def isQuantized(policy=None):
+	return np.issubdtype(fieldDtype('duration', policy), np.integer)
+
+def encodeDurations(durations, policy=None):
+	'''
+	Durations in seconds -> the policy's duration dtype (ticks of DURATION_STEP for quantized
+	policies, clipped to what fits)
+	'''
+	dtype = fieldDtype('duration', policy)
+	durations = np.asarray(durations, dtype=np.float64)
+	if isQuantized(policy):
+		ticks = np.rint(durations / DURATION_STEP)
+		return np.clip(ticks, 0, np.iinfo(dtype).max).astype(dtype)
+	return durations.astype(dtype)
+
+def decodeDurations(values, policy=None):
+	'''
+	Inverse of encodeDurations, gives seconds as float64
+	'''
+	values = np.asarray(values, dtype=np.float64)
+	if isQuantized(policy):
+		return values * DURATION_STEP
+	return values
+
+def encodeVelocities(velocities, policy=None):
+	return np.asarray(velocities).astype(fieldDtype('velocity', policy))
@@ -0,0 +1,167 @@
+import json
+import os
+
+import numpy as np
+
+import fileHash
+import midiNotes
+import noteStore
+import pianoRoll
+import rollDtypes
+
+'''
+Piano rolls of a piece at several time resolutions. The finest level gets rasterized
+from the notes once, every coarser level is pooled from a finer one (a cell is on if
+any of the cells it covers is on, and keeps the largest value), and all of them are
+cached on disk as .npy files, so asking for another timePerChunk doesn't re-read or
+re-rasterize the piece.
+
+Levels are named by their pooling factor over the finest level. With the defaults the
+finest level is 0.01s and the levels are 0.01, 0.02, 0.04, 0.1, 0.2, 0.5 and 1s per chunk.
+
+ex: the 0.1s onset roll of a piece, then a finer one for the same piece
+coarse = getLevel('Notes_From_Midi/chpn_op10_e01.npy', True, 0.1)
+fine = getLevel('Notes_From_Midi/chpn_op10_e01.npy', True, 0.02)
+'''
+
+BASE_TIME_PER_CHUNK = 0.01
+DEFAULT_FACTORS = (1, 2, 4, 10, 20, 50, 100)
+DEFAULT_CACHE_DIRECTORY = 'Roll_Pyramids'
+
+def loadPieceNotes(filepath):
+	'''
+	Notes of a piece from a .npy note store, a CSV, or a MIDI file
+	'''
+	if filepath.lower().endswith(('.mid', '.midi')):
+		noteonList, unmatchedList = midiNotes.midiFileToNotes(filepath)
+		midiNotes.reportUnmatchedNotes(filepath, unmatchedList)
+		return noteStore.noteListToArray(noteonList)
+	return noteStore.loadNotes(filepath)
+
+def poolRoll(roll, factor):
+	'''
+	Pool factor consecutive time chunks of a roll into one, keeping the max of each cell.
+	Works on num_notes x timeChunks rolls and on num_notes x timeChunks x 2 ones.
+
+	The pooled roll has ceil(timeChunks / factor) chunks, the same number rasterizing
+	at factor times the timePerChunk gives.
+	'''
+	numChunks = roll.shape[1]
+	numPooled = -(-numChunks // factor)
+	padded = np.zeros((roll.shape[0], numPooled * factor) + roll.shape[2:], dtype=roll.dtype)
+	padded[:, :numChunks] = roll
+	return padded.reshape((roll.shape[0], numPooled, factor) + roll.shape[2:]).max(axis=2)
+
+def poolPyramid(finest, factors):
+	'''
+	Pool the finest level of a pyramid into the levels with the given factors
+
+	Output:
+	dict mapping factor -> num_notes x timeChunks roll
+	'''
+	factors = sorted(set(factors))
+	levels = {1: finest}
+	for factor in factors:
+		if factor in levels:
+			continue
+		# pool from the coarsest level already built that divides this one, it's the least work
+		source = max(built for built in levels if factor % built == 0)
+		levels[factor] = poolRoll(levels[source], factor // source)
+	return dict((factor, levels[factor]) for factor in factors)
+
+def buildPyramid(notes, onsetOnly, factors=DEFAULT_FACTORS, baseTimePerChunk=BASE_TIME_PER_CHUNK,
+				 field='velocity', dtypePolicy=None):
+	'''
+	Build every level of the pyramid of a piece
+
+	Inputs
+	notes: note array (see noteStore.py)
+	onsetOnly: whether notes only fill the chunk of their onset, or every chunk they're held during
+	factors: pooling factor of each level over the finest one (baseTimePerChunk)
+	field: which value to put in the cells, 'velocity' or 'duration' (see pianoRoll.buildFieldRoll)
+	dtypePolicy: see rollDtypes.py
+
+	Output:
+	dict mapping factor -> num_notes x timeChunks roll
+	'''
+	return poolPyramid(pianoRoll.buildFieldRoll(notes, onsetOnly, baseTimePerChunk, field, dtypePolicy), factors)
+
+def pyramidDirectory(filepath, onsetOnly, baseTimePerChunk=BASE_TIME_PER_CHUNK, field='velocity',
+					 dtypePolicy=None, cacheDirectory=DEFAULT_CACHE_DIRECTORY):
+	'''
+	Where the pyramid of a piece is cached. The name includes the content hash of the
+	piece, so editing (or re-ingesting) the file starts a new pyramid.
+	'''
+	name = os.path.basename(filepath).split('.')[0]
+	description = '%s_%s_%g_%s'%('onset' if onsetOnly else 'held', field, baseTimePerChunk,
+								 rollDtypes.fieldDtype(field, dtypePolicy).name)
+	return os.path.join(cacheDirectory, '%s_%s_%s'%(name, fileHash.hashFile(filepath)[:12], description))
+
+def levelFactor(timePerChunk, baseTimePerChunk=BASE_TIME_PER_CHUNK):
+	'''
+	Pooling factor of a timePerChunk, or None if it isn't a whole multiple of the finest level
+	'''
+	factor = int(round(timePerChunk / baseTimePerChunk))
+	if factor < 1 or not np.isclose(factor * baseTimePerChunk, timePerChunk):
+		return None
+	return factor
+
+def loadPyramid(filepath, onsetOnly, factors=DEFAULT_FACTORS, baseTimePerChunk=BASE_TIME_PER_CHUNK,
+				field='velocity', dtypePolicy=None, cacheDirectory=DEFAULT_CACHE_DIRECTORY):
+	'''
+	Every level of the pyramid of a piece, built and cached the first time it's asked for
+
+	Inputs
+	filepath: the piece, a .npy note store, CSV or MIDI file
+	the rest: see buildPyramid, cacheDirectory is where the pyramids are kept
+
+	Output:
+	dict mapping factor -> num_notes x timeChunks roll. Cached levels are memory-mapped (read-only).
+	'''
+	directory = pyramidDirectory(filepath, onsetOnly, baseTimePerChunk, field, dtypePolicy, cacheDirectory)
+	levelPath = lambda factor: os.path.join(directory, 'x%d.npy'%(factor))
+
+	# the finest level is the expensive one, so the first build caches every default level along with the ones asked for
+	missing = [factor for factor in sorted(set(factors) | set(DEFAULT_FACTORS) | set([1])) if not os.path.exists(levelPath(factor))]
+	if missing:
+		print("==> Building roll pyramid of %s"%(filepath))
+		if not os.path.isdir(directory):
+			os.makedirs(directory)
+		if os.path.exists(levelPath(1)):
+			finest = np.load(levelPath(1), mmap_mode='r')
+		else:
+			finest = pianoRoll.buildFieldRoll(loadPieceNotes(filepath), onsetOnly, baseTimePerChunk, field, dtypePolicy)
+		levels = poolPyramid(finest, missing)
+		for factor in missing:
+			# write to a temporary file first so an interrupted run can't leave a half written level
+			tempPath = levelPath(factor)[:-len('.npy')] + '.tmp.npy'
+			np.save(tempPath, levels[factor])
+			os.replace(tempPath, levelPath(factor))
+
+		cached = sorted(int(filename[1:-len('.npy')]) for filename in os.listdir(directory)
+						if filename.startswith('x') and filename.endswith('.npy') and not filename.endswith('.tmp.npy'))
+		info = {'source': filepath, 'onsetOnly': onsetOnly, 'field': field, 'baseTimePerChunk': baseTimePerChunk,
+				'levels': dict(('x%d'%(factor), factor * baseTimePerChunk) for factor in cached)}
+		with open(os.path.join(directory, 'pyramid.json'), 'w') as f:
+			json.dump(info, f, indent=1, sort_keys=True)
+
+	return dict((factor, np.load(levelPath(factor), mmap_mode='r')) for factor in factors)
+
+def getLevel(filepath, onsetOnly, timePerChunk, field='velocity', dtypePolicy=None,
+			 cacheDirectory=DEFAULT_CACHE_DIRECTORY, baseTimePerChunk=BASE_TIME_PER_CHUNK):
+	'''
+	The roll of a piece at one time resolution, out of its pyramid
+
+	Any timePerChunk that is a whole multiple of baseTimePerChunk works, the levels that
+	aren't in DEFAULT_FACTORS get pooled and cached the first time they're asked for.
+	Anything else (ex: 1/3s) can't be pooled from the finest level, so it gets rasterized
+	directly and isn't cached.
+
+	Output:
+	a num_notes x timeChunks roll
+	'''
+	factor = levelFactor(timePerChunk, baseTimePerChunk)
+	if factor is None:
+		print("==> %g isn't a multiple of %g, rasterizing %s directly"%(timePerChunk, baseTimePerChunk, filepath))
+		return pianoRoll.buildFieldRoll(loadPieceNotes(filepath), onsetOnly, timePerChunk, field, dtypePolicy)
+	return loadPyramid(filepath, onsetOnly, [factor], baseTimePerChunk, field, dtypePolicy, cacheDirectory)[factor]
@@ -1,6 +1,13 @@
 import csv
 import numpy as np
 import os
+import midiNotes
+import noteStore
+import pianoRoll
+import frameSimilarity
+import rollPyramid
+import rollDtypes
+import artifactCache
 import scipy.io as sp
 import random
 import mido
@@ -23,57 +30,19 @@ def midiToCSV(directoriesIn, directoryOut):
             if '.DS_Store' not in files[i] and '._' not in files[i]:
                 totalFiles = totalFiles + 1
                 print('Processing file %g out of %g in directory: %s'%(i, len(files), files[i]))
-                mid = MidiFile(directory + files[i])
-
-                noteonList = []
-                midimsgList = []
-                accTime = []
-                countNote = 0
-                startTime = 0
-                
-                for msg in mid:
-
-                    # add all messages to list for ease of access
-                    midimsgList.append(msg)
-
-                    # Iterate through all midi message and accumulate time stamps
-                    if accTime == []:
-                        accTime.append(startTime)
-                    else:
-                        accTime.append(msg.time + accTime[-1])
-
-                for j in range(len(midimsgList)):
-                    msg = midimsgList[j]
-
-                    if msg.type == 'note_on' and msg.velocity > 0:
-                        countNote = countNote + 1 # for verification
-
-                        # loop through the message after the j-th message to find corresponding note-off event
-                        for k in range(j+1, len(midimsgList)):
-                            nextmsg = midimsgList[k]
-
-                            # Note: some midi files have no note-off events. Instead, it is note-on event with velocity = 0
-                            if nextmsg.type == 'note_off' or (nextmsg.type == 'note_on' and nextmsg.velocity == 0):
-                                if nextmsg.note == msg.note:
-                                    noteonList.append([msg.note, accTime[j], msg.velocity, accTime[k]-accTime[j]])
-                                    break
-
-                # Check that every note onset gets released
-                if countNote != len(noteonList):
-                    print("Mismatched number of data points. Something is wrong!", countNote, len(noteonList))
-                else:
-                    # Save list of note onsets to csv file
-                    name = files[i].split('.')
-                    outFileName = directoryOut +name[0]+'.csv'
-                    with open(outFileName, 'w') as csvfile:
-                        spamwriter = csv.writer(csvfile, delimiter=',',
-                                        quotechar='|', quoting=csv.QUOTE_MINIMAL)
-                        for row in noteonList:
-                            spamwriter.writerow(row)
-
-def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1):
+                noteonList, unmatchedList = midiNotes.midiFileToNotes(directory + files[i])
+
+                # notes that never get released are reported and left out, the rest of the file is still usable
+                midiNotes.reportUnmatchedNotes(files[i], unmatchedList)
+
+                # Save list of note onsets to csv file
+                name = files[i].split('.')
+                outFileName = directoryOut +name[0]+'.csv'
+                midiNotes.writeNoteCSV(noteonList, outFileName)
+
+def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1, dtypePolicy=None):
 	'''
-	Take a CSV file where row represents a note onset (note, onset_time, velocity, duration)
+	Take a CSV file (or .npy note store, see noteStore.py) where row represents a note onset (note, onset_time, velocity, duration)
 	and convert it into a matrix of size num_notes (128) x timeChunks x 2. The first element in the third
 	dimension will be duration and the second will be velocity
 
@@ -81,93 +50,72 @@ def createMatrixFromCSV(filepath, onsetOnly, timePerChunk=0.1):
 	If onsetOnly is false, the duration and velocity will appear in any time chunks the note is held during
 
 	Inputs
-	filepath: Filepath of the CSV file
+	filepath: Filepath of the CSV file or .npy note store
 	onsetOnly: whether to fill the matrix only at onset, or throughout its duration
 	timePerChunk: how much time each column in the matrix represents
+	dtypePolicy: dtypes of the matrix (see rollDtypes.py), None for the default policy
 
 	Output:
 	a num_notes x timeChunks x 2 (duration and velocity) matrix. 
 	'''
-	numPitches = 128;
-
-	# open your csv file
-	with open(filepath, 'r') as csvfile:
-		print("==> Reading File: %s"%(filepath))
-		myReader = csv.reader(csvfile)
-		# find the max time to figure out how big your matrix should be
-		maxTime = max([float(row[1]) for row in myReader])
-		# reset the reader
-		csvfile.seek(0)
-
-		# open it again to actually parse it, now that you know how big your matrix should be
-		curMatrix = np.zeros((numPitches, int(np.ceil(maxTime / timePerChunk)), 2))
-		
-		# read each row and add into the matrix that represents the song
-		# the csv is in the form: note, time, velocity, duration and has a row for every note onset in the song
-		numNotes = 0
-		for row in myReader:
-			numNotes = numNotes + 1
-			[note, curTime, velocity, duration] = [int(row[0]), float(row[1]), int(row[2]), float(row[3])]
-			
-			# either put an entry just for the onset, or put an entry at every point in its duration
-			if onsetOnly:
-				curMatrix[note, int(np.floor(curTime / timePerChunk)), :] = [duration, velocity]
-			else :
-				# fill in spots after the onset based on the duration
-				# any spot in the matrix it is on during gets turned on
-				curMatrix[note, int(np.floor(curTime / timePerChunk)):int(np.floor((curTime + duration) / timePerChunk)) + 1, :] = [duration, velocity]
-
-	return curMatrix
+	# with the artifact cache on, the roll is cached on disk by the contents of the file (see artifactCache.py), so only new or changed files get read
+	print("==> Reading File: %s"%(filepath))
+	return pianoRoll.loadPianoRoll(filepath, onsetOnly, timePerChunk, dtypePolicy)
 
 def similarity(mat):
+	'''
+	Self-similarity of a logical num_notes x timeChunks matrix, comparing every window of
+	hopsize frames to every other one. mat can be dense or a scipy.sparse roll
+	(see pianoRoll.buildSparseRoll).
+	'''
 	hopsize = 2
 
 	width = np.shape(mat)[1]
-	height = np.shape(mat)[0]
 
 	print(width)
 
-	size = width - hopsize + 1
-
-	similarityMat = np.empty([size,size])
-
-	for i in range(size):
-		A = mat[:height, i:i+hopsize]
-		aOn = np.sum(A)
-
-		for j in range(size):
-			B = mat[:height, j:j+hopsize]
-			bOn = np.sum(B)
-
-			sameOn = np.sum(np.logical_and(A,B))
-
-			if (aOn == 0 and bOn == 0):
-				similarity = 1
-			else:
-				similarity = (2 * sameOn) / (aOn + bOn)
-
-			similarityMat[i][j] = similarity
-
+	# windows where no notes are on at all count as the same
 	# vertically flip because similarity matrices are defined stupidly
-	similarityMat = np.flipud(similarityMat)
+	# (cached on disk by the contents of mat when the artifact cache is on, see artifactCache.py)
+	params = {'hopsize': hopsize, 'dtypePolicy': rollDtypes.policyKey()}
+	similarityMat = artifactCache.cachedCall('similarity', [mat], params,
+											 lambda: np.flipud(frameSimilarity.windowedDice(mat, mat, hopsize, emptyValue=1)))
 
 	im = Image.fromarray(similarityMat * 256)
 	im.show()
 
 	return similarityMat
 
-def csvToSelfSimilarityAndMatrixRep(filename, onsetOnly):
+def csvToSelfSimilarityAndMatrixRep(filename, onsetOnly, sparse=False):
 	'''
 	Take in the path to a CSV file that contains the MIDI data
 	Output a self-similarity matrix from that MIDI file
 	Also output its binary matrix representation
 
 	filename:
+	sparse: keep the binary matrix as a scipy.sparse CSC matrix instead of a dense one
 	'''
 	# ahhhh think about time per chunk at some point
-	origMatrix = createMatrixFromCSV(filename, onsetOnly)
-	origVelocityOnly = origMatrix[:, :, 1]
-	origLogicalMat = origVelocityOnly.astype(bool)
+	if sparse:
+		print("==> Reading File: %s"%(filename))
+		origLogicalMat = pianoRoll.buildSparseRoll(noteStore.loadNotes(filename), onsetOnly).astype(bool)
+	else:
+		origMatrix = createMatrixFromCSV(filename, onsetOnly)
+		origVelocityOnly = origMatrix[:, :, 1]
+		origLogicalMat = origVelocityOnly.astype(bool)
+	origSim = similarity(origLogicalMat)
+	return origSim, origLogicalMat
+
+def midiToSimilarityAndMatrixRep(filename, fs, onsetOnly=False):
+	'''
+	Take in the path to a MIDI file (or a CSV / .npy note store of one)
+	Output a self-similarity matrix sampled fs times a second
+	Also output its binary matrix representation
+
+	The matrix comes out of the piece's roll pyramid (see rollPyramid.py), so trying
+	another fs doesn't re-read the file
+	'''
+	origLogicalMat = rollPyramid.getLevel(filename, onsetOnly, 1. / fs).astype(bool)
 	origSim = similarity(origLogicalMat)
 	return origSim, origLogicalMat
 
@@ -0,0 +1,172 @@
+import argparse
+import os
+
+import numpy as np
+import scipy.special
+
+import corpusCatalog
+import nGramCorpus
+import transitionMatrix
+
+'''
+How far apart two pieces are in style, measured as the divergence between their pitch
+transition matrices (see transitionMatrix.py), for every Chopin etude against every
+Godowsky version at once.
+
+Every piece's transition matrix is built over all 128 midi pitches so they line up, and
+the models are stacked into one numPieces x 128 x 128 array. The divergence between two
+models is the average, over the columns (the note being left) that both of them use, of the
+divergence between their distributions of the next note. A column only one of the pieces
+uses (a pitch the other never leaves) has nothing to compare it to, so it's left out rather
+than counted as a maximal (js) or smoothed to uniform (kl) divergence. Two models that share
+no columns are NaN apart.
+
+'kl': symmetrized Kullback-Leibler, KL(A||B) + KL(B||A). KL(A||B) = sum A log A - sum A log B,
+	  and the cross terms of every pair of models are one matrix product of the stacked
+	  models with the stacked logs. Columns are smoothed first so no log is of 0.
+'js': Jensen-Shannon, which needs no smoothing and stays between 0 and log 2. It has no
+	  matrix product form, so it is computed over blocks of pairs at a time.
+
+ex: every Chopin etude against every Godowsky version in the CSVs
+python styleDistance.py CSV_From_Midi/ --metric js --out style_js.npy
+'''
+
+NUM_PITCHES = 128
+# added to every probability before taking logs for 'kl', then the columns get renormalized
+DEFAULT_SMOOTHING = 1e-6
+
+def modelStack(filepaths, timePerChunk=0.1):
+	'''
+	numPieces x 128 x 128 stack of the top voice's pitch transition matrix of every piece
+	(see nGramCorpus.pieceSequence). Column i of a model is the distribution of the pitch
+	after pitch i, all zeros for pitches the piece never leaves.
+	'''
+	pitches = np.arange(NUM_PITCHES)
+	models = np.zeros((len(filepaths), NUM_PITCHES, NUM_PITCHES))
+	for i, filepath in enumerate(filepaths):
+		models[i] = transitionMatrix.buildTransitionMatrix(nGramCorpus.pieceSequence(filepath, 'pitch', timePerChunk), pitches)[0]
+	return models
+
+def usedColumns(models):
+	'''
+	numModels x numNotes float array, 1 for the columns of every model that aren't all zeros
+	'''
+	return (models.sum(axis=1) > 0).astype(np.float64)
+
+def sharedAverage(totals, usedA, usedB):
+	'''
+	Divide the per pair totals over shared columns by how many columns each pair shares (NaN when it's none)
+	'''
+	shared = usedA.dot(usedB.T)
+	return np.divide(totals, shared, out=np.full(totals.shape, np.nan), where=shared > 0)
+
+def smoothModels(models, smoothing=DEFAULT_SMOOTHING):
+	'''
+	Add smoothing to every probability and renormalize the columns, so every column is a
+	proper distribution with nothing at 0 (a column of zeros becomes uniform)
+	'''
+	smoothed = models + smoothing
+	return smoothed / smoothed.sum(axis=1, keepdims=True)
+
+def klDistanceMatrix(modelsA, modelsB, smoothing=DEFAULT_SMOOTHING):
+	'''
+	Symmetrized KL divergence between every model of modelsA and every model of modelsB
+
+	Inputs
+	modelsA, modelsB: numA x numNotes x numNotes and numB x numNotes x numNotes stacks of transition matrices
+
+	Output:
+	numA x numB array, the average of KL(A||B) + KL(B||A) over the columns both models use
+	(NaN for pairs that share none)
+	'''
+	usedA = usedColumns(modelsA)
+	usedB = usedColumns(modelsB)
+	# unused columns are zeroed after smoothing, so every term below only counts columns used by both models
+	smoothedA = smoothModels(modelsA, smoothing) * usedA[:, None, :]
+	smoothedB = smoothModels(modelsB, smoothing) * usedB[:, None, :]
+	logA = np.log(np.where(smoothedA > 0, smoothedA, 1))
+	logB = np.log(np.where(smoothedB > 0, smoothedB, 1))
+
+	# sum A log A - sum A log B + sum B log B - sum B log A, the cross terms of every pair in two GEMMs
+	selfA = np.sum(smoothedA * logA, axis=1)
+	selfB = np.sum(smoothedB * logB, axis=1)
+	flatA = smoothedA.reshape(len(modelsA), -1)
+	flatB = smoothedB.reshape(len(modelsB), -1)
+	divergence = (selfA.dot(usedB.T) + usedA.dot(selfB.T)
+				  - flatA.dot(logB.reshape(len(modelsB), -1).T) - logA.reshape(len(modelsA), -1).dot(flatB.T))
+	return sharedAverage(np.maximum(divergence, 0), usedA, usedB)
+
+def jsDistanceMatrix(modelsA, modelsB, blockRows=8):
+	'''
+	Jensen-Shannon divergence between every model of modelsA and every model of modelsB
+
+	Inputs
+	modelsA, modelsB: numA x numNotes x numNotes and numB x numNotes x numNotes stacks of transition matrices
+	blockRows: how many models of modelsA to compare at a time (bounds the memory to blockRows x numB x numNotes^2)
+
+	Output:
+	numA x numB array, the average of the JS divergence (natural log) over the columns both
+	models use (NaN for pairs that share none)
+	'''
+	usedA = usedColumns(modelsA)
+	usedB = usedColumns(modelsB)
+	# sum over the next note of every column, xlogy gives 0 log 0 = 0
+	selfA = np.sum(scipy.special.xlogy(modelsA, modelsA), axis=1)
+	selfB = np.sum(scipy.special.xlogy(modelsB, modelsB), axis=1)
+
+	divergence = np.zeros((len(modelsA), len(modelsB)))
+	for start in range(0, len(modelsA), blockRows):
+		block = slice(start, start + blockRows)
+		middle = (modelsA[block, None] + modelsB[None, :]) / 2
+		# JS of every column = (sum A log A + sum B log B) / 2 - sum M log M, with M the average of the two
+		columnDivergence = (selfA[block, None] + selfB[None, :]) / 2 - np.sum(scipy.special.xlogy(middle, middle), axis=2)
+		shared = usedA[block, None] * usedB[None, :]
+		divergence[block] = np.sum(np.maximum(columnDivergence, 0) * shared, axis=2)
+	return sharedAverage(divergence, usedA, usedB)
+
+def styleDistanceMatrix(filepathsA, filepathsB, metric='js', timePerChunk=0.1):
+	'''
+	Divergence between the pitch transitions of every piece in filepathsA and every piece in filepathsB
+
+	Inputs
+	filepathsA, filepathsB: CSVs or note stores
+	metric: 'js' or 'kl' (see the top of this file)
+
+	Output:
+	len(filepathsA) x len(filepathsB) array
+	'''
+	modelsA = modelStack(filepathsA, timePerChunk)
+	modelsB = modelStack(filepathsB, timePerChunk)
+	if metric == 'js':
+		return jsDistanceMatrix(modelsA, modelsB)
+	if metric == 'kl':
+		return klDistanceMatrix(modelsA, modelsB)
+	raise ValueError("metric has to be 'js' or 'kl', not %r"%(metric))
+
+def composerPieces(filepaths, composer):
+	'''
+	The files whose names say they're by composer (see corpusCatalog.parsePieceKey)
+	'''
+	return [filepath for filepath in filepaths if corpusCatalog.parsePieceKey(filepath)['composer'] == composer]
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Divergence between the pitch transitions of every Chopin etude and every Godowsky version.')
+	parser.add_argument('paths', nargs='+', help='CSVs or note stores, or directories of them')
+	parser.add_argument('--metric', choices=['js', 'kl'], default='js', help='Jensen-Shannon or symmetrized KL')
+	parser.add_argument('--time-per-chunk', type=float, default=0.1, help='time resolution of the rolls')
+	parser.add_argument('--out', default=None, help='save the distance matrix (rows Chopin, columns Godowsky) to this .npy file')
+	args = parser.parse_args()
+
+	filepaths = nGramCorpus.findNoteFiles(args.paths)
+	chopin = composerPieces(filepaths, 'chopin')
+	godowsky = composerPieces(filepaths, 'godowsky')
+	distances = styleDistanceMatrix(chopin, godowsky, args.metric, args.time_per_chunk)
+	print('==> %d Chopin x %d Godowsky distances'%(distances.shape[0], distances.shape[1]))
+	for j, filepath in enumerate(godowsky):
+		if np.all(np.isnan(distances[:, j])):
+			print('%s shares no notes with any Chopin etude'%(os.path.basename(filepath)))
+			continue
+		print('%s is closest to %s (%g)'%(os.path.basename(filepath), os.path.basename(chopin[np.nanargmin(distances[:, j])]), np.nanmin(distances[:, j])))
+	if args.out is not None:
+		np.save(args.out, distances)
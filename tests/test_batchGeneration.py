@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+import batchGeneration
+import nGramCounts
+
+
+def test_generateMarkovBatch_rejects_start_notes_without_a_column():
+	matrix = np.array([[0.0, 1.0],
+					   [1.0, 0.0]])
+	notes = np.array([62, 60])
+
+	songs = batchGeneration.generateMarkovBatch(matrix, notes, [60, 62], 3, rng=np.random.default_rng(0))
+	np.testing.assert_array_equal(songs, [[60, 62, 60, 62], [62, 60, 62, 60]])
+	with pytest.raises(ValueError):
+		batchGeneration.generateMarkovBatch(matrix, notes, [60, 61], 3)
+	with pytest.raises(ValueError):
+		batchGeneration.generateMarkovBatch(matrix, notes, [63], 3)
+
+def test_symbolIds_rejects_symbols_missing_from_the_vocabulary():
+	vocabulary = np.array([60, 62])
+
+	np.testing.assert_array_equal(nGramCounts.symbolIds([62, 60, 62], vocabulary), [1, 0, 1])
+	with pytest.raises(ValueError):
+		nGramCounts.countNGrams(np.array([60, 62, 64]), 2, vocabulary)
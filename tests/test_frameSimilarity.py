@@ -0,0 +1,17 @@
+import numpy as np
+import scipy.sparse
+
+import frameSimilarity
+
+
+def test_packed_counts_match_the_matrix_product():
+	rng = np.random.default_rng(0)
+	matA = rng.random((128, 70)) < 0.1
+	matB = rng.random((128, 90)) < 0.1
+	expected = matA.T.astype(np.int64) @ matB.astype(np.int64)
+
+	np.testing.assert_array_equal(frameSimilarity.sharedNoteCounts(matA, matB), expected)
+	np.testing.assert_array_equal(frameSimilarity.sharedNoteCounts(matA, matB, packed=True), expected)
+	np.testing.assert_array_equal(frameSimilarity.sharedNoteCounts(scipy.sparse.csc_matrix(matA), matB), expected)
+	np.testing.assert_array_equal(frameSimilarity.windowedDice(matA, matB, 4, packed=True),
+								  frameSimilarity.windowedDice(matA, matB, 4))
@@ -0,0 +1,40 @@
+from mido import Message
+
+import midiNotes
+
+
+def test_pairNoteEvents_pairs_overlaps_velocity_zero_releases_and_channels():
+	messages = [
+		Message('note_on', note=60, velocity=80, time=0),
+		# a second onset of the same pitch before the first is released
+		Message('note_on', note=60, velocity=70, time=0.5),
+		# the same pitch on another channel is a different note
+		Message('note_on', note=60, velocity=50, channel=1, time=0.25),
+		# a note_on with velocity 0 is a release, and closes both open notes on channel 0
+		Message('note_on', note=60, velocity=0, time=0.25),
+		Message('note_on', note=64, velocity=90, time=0.5),
+		Message('note_off', note=64, velocity=0, time=1.0),
+		Message('note_off', note=60, velocity=0, channel=1, time=0.5),
+	]
+
+	noteonList, unmatchedList = midiNotes.pairNoteEvents(messages)
+
+	assert noteonList == [[60, 0, 80, 1.0, 0],
+						  [60, 0.5, 70, 0.5, 0],
+						  [60, 0.75, 50, 2.25, 1],
+						  [64, 1.5, 90, 1.0, 0]]
+	assert unmatchedList == []
+
+def test_pairNoteEvents_reports_notes_that_are_never_released():
+	messages = [
+		Message('note_on', note=60, velocity=80, time=0),
+		Message('note_on', note=62, velocity=40, channel=2, time=0.5),
+		# a release on the wrong channel doesn't close it
+		Message('note_off', note=62, velocity=0, channel=3, time=0.5),
+		Message('note_off', note=60, velocity=0, time=0.5),
+	]
+
+	noteonList, unmatchedList = midiNotes.pairNoteEvents(messages)
+
+	assert noteonList == [[60, 0, 80, 1.5, 0]]
+	assert unmatchedList == [[62, 0.5, 40, 2]]
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+import scipy.sparse
+
+import batchGeneration
+import modelFile
+import nGramModel
+
+
+def assertModelsEqual(loaded, model):
+	assert loaded['maxOrder'] == model['maxOrder']
+	np.testing.assert_array_equal(loaded['vocabulary'], model['vocabulary'])
+	for field in ('contextKeys', 'offsets', 'successors', 'cumulativeCounts'):
+		assert sorted(loaded[field]) == sorted(model[field])
+		for k in model[field]:
+			assert loaded[field][k].dtype == model[field][k].dtype
+			assert loaded[field][k].tobytes() == model[field][k].tobytes()
+
+def test_nGramModel_round_trip(tmp_path):
+	rng = np.random.default_rng(0)
+	# a small vocabulary packs the keys into int64s, a big one at order 6 needs np.void keys
+	for sequence, maxOrder in [(rng.integers(50, 60, 400), 4), (rng.integers(0, 2000, 3000), 6)]:
+		model = nGramModel.modelFromSequence(sequence, maxOrder)
+		filepath = str(tmp_path / 'pitch.model')
+		modelFile.saveNGramModel(filepath, model)
+
+		for mmap in [True, False]:
+			loaded = modelFile.loadNGramModel(filepath, mmap)
+			assertModelsEqual(loaded, model)
+
+			# the loaded model generates the same songs, one at a time and in a batch
+			seed = sequence[:maxOrder - 1]
+			np.testing.assert_array_equal(nGramModel.generate(loaded, seed, 50, np.random.default_rng(1)),
+										  nGramModel.generate(model, seed, 50, np.random.default_rng(1)))
+			np.testing.assert_array_equal(batchGeneration.generateNGramBatch(loaded, [seed, seed], 50, np.random.default_rng(2)),
+										  batchGeneration.generateNGramBatch(model, [seed, seed], 50, np.random.default_rng(2)))
+
+def test_mmap_arrays_are_read_only(tmp_path):
+	filepath = str(tmp_path / 'pitch.model')
+	modelFile.saveNGramModel(filepath, nGramModel.modelFromSequence([60, 62, 64, 62, 60], 2))
+
+	loaded = modelFile.loadNGramModel(filepath)
+	with pytest.raises(ValueError):
+		loaded['successors'][2][0] = 0
+
+def test_sparse_transition_model_round_trip(tmp_path):
+	# column i is where note i goes next, the note 67 column was never followed by anything
+	matrix = scipy.sparse.csc_matrix(np.array([[0.0, 0.5, 0.0, 0.0],
+											   [1.0, 0.0, 1.0, 0.0],
+											   [0.0, 0.5, 0.0, 0.0],
+											   [0.0, 0.0, 0.0, 0.0]]))
+	notes = np.array([60, 62, 64, 67])
+	filepath = str(tmp_path / 'markov.model')
+	modelFile.saveTransitionModel(filepath, matrix, notes)
+
+	loaded, loadedNotes = modelFile.loadTransitionModel(filepath, mmap=True)
+	assert scipy.sparse.issparse(loaded)
+	# the arrays are still the read-only views of the map, not copies scipy made of them
+	assert not loaded.data.flags.writeable and not loaded.indices.flags.writeable and not loaded.indptr.flags.writeable
+	np.testing.assert_array_equal(loaded.toarray(), matrix.toarray())
+	np.testing.assert_array_equal(loadedNotes, notes)
+	np.testing.assert_array_equal(batchGeneration.generateMarkovBatch(loaded, loadedNotes, [60, 62, 67], 20, np.random.default_rng(0)),
+								  batchGeneration.generateMarkovBatch(matrix, notes, [60, 62, 67], 20, np.random.default_rng(0)))
+
+def test_load_rejects_the_wrong_kind_of_model(tmp_path):
+	filepath = str(tmp_path / 'markov.model')
+	modelFile.saveTransitionModel(filepath, np.eye(2), np.array([60, 62]))
+
+	with pytest.raises(ValueError):
+		modelFile.loadNGramModel(filepath)
@@ -0,0 +1,79 @@
+from collections import Counter
+
+import numpy as np
+
+import nGramCounts
+
+
+def windowCounter(sequence, n):
+	# the reference: one tuple per window
+	sequence = list(sequence)
+	return Counter(tuple(sequence[i:i + n]) for i in range(len(sequence) - n + 1))
+
+def tableCounter(table):
+	return Counter(dict(zip(map(tuple, nGramCounts.gramsOf(table).tolist()), table['counts'].tolist())))
+
+def smallSequence():
+	# packed int64 keys
+	return np.random.default_rng(0).integers(0, 5, 300)
+
+def bigSequence():
+	# 3000 symbols to the 8th doesn't fit in an int64, so these get np.void keys, the repeated
+	# stretch makes sure some 8-grams are seen more than once
+	rng = np.random.default_rng(1)
+	stretch = rng.integers(0, 3000, 50)
+	return np.concatenate([rng.permutation(3000), stretch, rng.integers(0, 3000, 500), stretch, stretch])
+
+def test_countNGrams_matches_counter():
+	for sequence, n, kind in [(smallSequence(), 3, 'i'), (bigSequence(), 8, 'V')]:
+		table = nGramCounts.countNGrams(sequence, n)
+
+		assert table['keys'].dtype.kind == kind
+		# sorted and distinct (void keys have no <, so compare against np.unique)
+		assert np.unique(table['keys']).tobytes() == table['keys'].tobytes()
+		assert tableCounter(table) == windowCounter(sequence, n)
+
+def test_countNGrams_of_short_sequence_is_empty():
+	table = nGramCounts.countNGrams([1, 2], 3)
+
+	assert len(table['keys']) == 0 and len(table['counts']) == 0
+
+def test_topNGrams_most_frequent_first():
+	for sequence, n in [(smallSequence(), 3), (bigSequence(), 8)]:
+		table = nGramCounts.countNGrams(sequence, n)
+		grams, counts = nGramCounts.topNGrams(table, 10)
+		reference = windowCounter(sequence, n)
+
+		assert len(grams) == 10
+		assert np.all(counts[:-1] >= counts[1:])
+		assert [reference[tuple(gram)] for gram in grams.tolist()] == counts.tolist()
+		# nothing left out is more frequent than the last one kept
+		assert sorted(reference.values(), reverse=True)[:10] == counts.tolist()
+
+def test_mergeTables_equals_counting_the_concatenation():
+	for sequence, n in [(smallSequence(), 3), (bigSequence(), 8)]:
+		first, second = sequence[:len(sequence) // 2], sequence[len(sequence) // 2:] + 1
+		merged = nGramCounts.mergeTables([nGramCounts.countNGrams(first, n), nGramCounts.countNGrams(second, n)])
+
+		# the two pieces are counted apart, so the windows that straddle the join aren't in it
+		joined = np.concatenate([first, second])
+		straddling = windowCounter(joined[len(first) - n + 1:len(first) + n - 1], n)
+		assert tableCounter(merged) == windowCounter(joined, n) - straddling
+		np.testing.assert_array_equal(merged['vocabulary'], np.unique(joined))
+
+def test_mergeTables_of_unigrams_is_exact():
+	sequence = smallSequence()
+	merged = nGramCounts.mergeTables([nGramCounts.countNGrams(sequence[:100], 1), nGramCounts.countNGrams(sequence[100:], 1)])
+
+	assert tableCounter(merged) == tableCounter(nGramCounts.countNGrams(sequence, 1))
+
+def test_suffixTable_and_prefixTable():
+	for sequence, n in [(smallSequence(), 4), (bigSequence(), 8)]:
+		table = nGramCounts.countNGrams(sequence, n)
+		for k in range(1, n):
+			# the suffixes miss the first n - k windows, the prefixes the last n - k
+			assert tableCounter(nGramCounts.suffixTable(table, k)) == windowCounter(sequence[n - k:], k)
+			assert tableCounter(nGramCounts.prefixTable(table, k)) == windowCounter(sequence[:len(sequence) - n + k], k)
+
+		exact = nGramCounts.prefixTable(table, n - 1, sequence[len(sequence) - n + 1:])
+		assert tableCounter(exact) == windowCounter(sequence, n - 1)
@@ -0,0 +1,71 @@
+import numpy as np
+
+import noteStore
+import pianoRoll
+
+
+def test_pathTimes_maps_rows_to_piece_two_and_columns_to_piece_one():
+	timesOne = np.array([0.0, 0.3, 0.5])
+	timesTwo = np.array([0.1, 0.2, 0.6, 0.9])
+	# piece two plays its first two frames over the first frame of piece one, then they move together
+	path = np.array([[0, 1, 2, 3],
+					 [0, 0, 1, 2]])
+
+	secondsOne, secondsTwo = pianoRoll.pathTimes(path, timesOne, timesTwo)
+
+	np.testing.assert_allclose(secondsOne, [0.0, 0.0, 0.3, 0.5])
+	np.testing.assert_allclose(secondsTwo, [0.1, 0.2, 0.6, 0.9])
+
+def test_pathTimes_of_flipped_cost_matrix():
+	# a findCosimilarityMatrix cost matrix is upside down: row r is frame numFramesTwo - 1 - r of piece two
+	timesOne = np.array([0.0, 0.4])
+	timesTwo = np.array([0.0, 0.2, 0.5])
+	flippedPath = np.array([[2, 1, 0],
+							[0, 0, 1]])
+	path = flippedPath.copy()
+	path[0] = len(timesTwo) - 1 - flippedPath[0]
+
+	secondsOne, secondsTwo = pianoRoll.pathTimes(path, timesOne, timesTwo)
+
+	np.testing.assert_allclose(secondsOne, [0.0, 0.0, 0.4])
+	np.testing.assert_allclose(secondsTwo, [0.0, 0.2, 0.5])
+
+def test_stepTicks():
+	# 480 ticks per beat at 120 bpm is 960 ticks a second
+	ticks = pianoRoll.stepTicks(np.array([0.0, 0.0, 0.3, 0.2, 0.5]), 480)
+
+	np.testing.assert_array_equal(ticks, [0, 288, 0, 288, 80])
+
+def loopRoll(noteonList, onsetOnly, timePerChunk):
+	# the roll builder from before it was vectorized: one note at a time, in order
+	maxTime = max(row[1] for row in noteonList)
+	curMatrix = np.zeros((128, int(np.ceil(maxTime / timePerChunk)), 2))
+	for note, curTime, velocity, duration in noteonList:
+		if onsetOnly:
+			curMatrix[note, int(np.floor(curTime / timePerChunk)), :] = [duration, velocity]
+		else:
+			curMatrix[note, int(np.floor(curTime / timePerChunk)):int(np.floor((curTime + duration) / timePerChunk)) + 1, :] = [duration, velocity]
+	return curMatrix
+
+# rows of [note, onset, velocity, duration], times are multiples of 1/4 so the frame maths is exact
+ROLL_NOTES = [[60, 0.0, 80, 1.0],
+			  [60, 0.5, 100, 0.25],	# starts on a frame boundary inside the first note, and wins there
+			  [62, 0.25, 70, 0.5],
+			  [62, 0.25, 90, 0.25],	# same onset as the note before it, so it wins its frames
+			  [64, 1.1, 50, 2.0]]	# runs past the end of the roll
+
+def test_buildPianoRoll_matches_note_loop():
+	notes = noteStore.noteListToArray(ROLL_NOTES)
+	for onsetOnly in [True, False]:
+		expected = loopRoll(ROLL_NOTES, onsetOnly, 0.25)
+
+		np.testing.assert_array_equal(pianoRoll.buildPianoRoll(notes, onsetOnly, 0.25, 'float64'), expected)
+		np.testing.assert_array_equal(pianoRoll.buildFieldRoll(notes, onsetOnly, 0.25, 'velocity', 'float64'), expected[:, :, 1])
+		np.testing.assert_array_equal(pianoRoll.buildFieldRoll(notes, onsetOnly, 0.25, 'duration', 'float64'), expected[:, :, 0])
+		np.testing.assert_array_equal(pianoRoll.buildSparseRoll(notes, onsetOnly, 0.25, 'velocity', 'float64').toarray(), expected[:, :, 1])
+
+def test_buildPianoRoll_later_note_wins():
+	roll = pianoRoll.buildPianoRoll(noteStore.noteListToArray(ROLL_NOTES), False, 0.25, 'float64')
+
+	np.testing.assert_array_equal(roll[60, :, 1], [80, 80, 100, 100, 80])
+	np.testing.assert_array_equal(roll[62, :, 1], [0, 90, 90, 70, 0])
@@ -0,0 +1,42 @@
+import numpy as np
+from scipy.spatial.distance import jensenshannon
+
+import styleDistance
+
+
+def randomModels(rng, numModels, numNotes, unusedColumns):
+	models = rng.random((numModels, numNotes, numNotes)) * (rng.random((numModels, numNotes, numNotes)) < 0.6)
+	models[:, 0, :] += 0.1
+	for model, unused in zip(models, unusedColumns):
+		model[:, unused] = 0
+	return models / np.maximum(models.sum(axis=1, keepdims=True), 1e-300)
+
+def test_js_matches_scipy_over_shared_columns():
+	rng = np.random.default_rng(0)
+	# column 4 is only used by A, column 5 by neither, so only columns 0 to 3 are compared
+	modelsA = randomModels(rng, 1, 6, [[5]])
+	modelsB = randomModels(rng, 1, 6, [[4, 5]])
+
+	expected = np.mean([jensenshannon(modelsA[0][:, c], modelsB[0][:, c]) ** 2 for c in range(4)])
+
+	np.testing.assert_allclose(styleDistance.jsDistanceMatrix(modelsA, modelsB), [[expected]], rtol=1e-10)
+
+def test_distances_of_every_pair_over_their_shared_columns():
+	rng = np.random.default_rng(1)
+	modelsA = randomModels(rng, 3, 5, [[], [1], [0, 2]])
+	modelsB = randomModels(rng, 2, 5, [[3], [0, 1, 2, 3, 4]])
+
+	js = styleDistance.jsDistanceMatrix(modelsA, modelsB, blockRows=2)
+	kl = styleDistance.klDistanceMatrix(modelsA, modelsB)
+
+	smoothedA = styleDistance.smoothModels(modelsA)
+	smoothedB = styleDistance.smoothModels(modelsB)
+	for i in range(3):
+		shared = [c for c in range(5) if modelsA[i][:, c].sum() > 0 and modelsB[0][:, c].sum() > 0]
+		expectedJS = np.mean([jensenshannon(modelsA[i][:, c], modelsB[0][:, c]) ** 2 for c in shared])
+		a, b = smoothedA[i][:, shared], smoothedB[0][:, shared]
+		expectedKL = np.mean(np.sum((a - b) * np.log(a / b), axis=0))
+		np.testing.assert_allclose(js[i, 0], expectedJS, rtol=1e-10)
+		np.testing.assert_allclose(kl[i, 0], expectedKL, rtol=1e-8)
+	# the second model of B never leaves any note
+	assert np.all(np.isnan(js[:, 1])) and np.all(np.isnan(kl[:, 1]))
@@ -0,0 +1,75 @@
+import numpy as np
+import scipy.sparse
+
+import transitionMatrix
+
+
+def test_eigen_steady_state_matches_power_iteration_on_sparse_chains():
+	# 2 notes is too small for scipy's eigs, 4 notes goes through it; note 3 is a dead end in the bigger chain
+	small = np.array([[0.5, 1.0],
+					  [0.5, 0.0]])
+	bigger = np.array([[0.0, 0.5, 0.0, 0.0],
+					   [1.0, 0.0, 0.5, 0.0],
+					   [0.0, 0.5, 0.0, 0.0],
+					   [0.0, 0.0, 0.5, 0.0]])
+	for matrix in (small, bigger):
+		expected = transitionMatrix.getSteadyStateDistribution(matrix, method='power')
+		for given in (matrix, scipy.sparse.csc_matrix(matrix)):
+			steadyState = transitionMatrix.getSteadyStateDistribution(given, method='eigen')
+			np.testing.assert_allclose(steadyState, expected, atol=1e-9)
+
+def test_zero_columns_stay_zero():
+	counts = np.array([[0.0, 2.0, 0.0],
+					   [3.0, 0.0, 0.0],
+					   [1.0, 2.0, 0.0]])
+	for given in (counts, scipy.sparse.csc_matrix(counts)):
+		normalized = transitionMatrix.normalizeColumns(given)
+		dense = normalized.toarray() if scipy.sparse.issparse(normalized) else normalized
+
+		assert not np.any(np.isnan(dense))
+		np.testing.assert_array_equal(dense[:, 2], 0)
+		np.testing.assert_allclose(dense[:, :2].sum(axis=0), 1)
+		np.testing.assert_allclose(dense[:, 0], [0, 0.75, 0.25])
+
+def test_buildTransitionMatrix_last_note_column_is_zero():
+	# 67 only comes at the very end, so nothing ever follows it
+	for sparse in (False, True):
+		matrix, index = transitionMatrix.buildTransitionMatrix([60, 62, 60, 64, 60, 62, 67], sparse=sparse)
+		dense = matrix.toarray() if sparse else matrix
+
+		np.testing.assert_array_equal(index, [60, 62, 64, 67])
+		assert not np.any(np.isnan(dense))
+		np.testing.assert_array_equal(dense[:, 3], 0)
+		np.testing.assert_allclose(dense[:, :3].sum(axis=0), 1)
+		# 60 went to 62 twice and to 64 once
+		np.testing.assert_allclose(dense[:, 0], [0, 2 / 3, 1 / 3, 0])
+
+def test_higher_order_model_matches_hand_counts():
+	piece = [60, 62, 64, 60, 62, 67, 60, 62, 64]
+	# a second piece on its own, its windows don't run on from the end of the first
+	model = transitionMatrix.buildHigherOrderModel([np.array(piece), np.array([67, 64])], 2)
+
+	np.testing.assert_array_equal(model['index'], [60, 62, 64, 67])
+	# contexts as base 4 digits: (60, 62) = 1, (62, 64) = 6, (62, 67) = 7, (64, 60) = 8, (67, 60) = 12, (67, 64) = 14
+	np.testing.assert_array_equal(model['contextIds'], [1, 6, 7, 8, 12, 14])
+	assert scipy.sparse.isspmatrix_csr(model['transitions'])
+	np.testing.assert_allclose(model['transitions'].toarray(), [[0, 0, 2 / 3, 1 / 3],	# (60, 62) went to 64 twice, 67 once
+																[1, 0, 0, 0],
+																[1, 0, 0, 0],
+																[0, 1, 0, 0],
+																[0, 1, 0, 0],
+																[0, 0, 0, 0]])	# (67, 64) ends the second piece
+
+def test_generateHigherOrderBatch_only_makes_transitions_from_the_source():
+	piece = [60, 62, 64, 60, 62, 67, 60, 62, 64]
+	model = transitionMatrix.buildHigherOrderModel(np.array(piece), 2)
+	sourceWindows = set(tuple(piece[i:i + 3]) for i in range(len(piece) - 2))
+
+	songs = transitionMatrix.generateHigherOrderBatch(model, [[60, 62], [64, 60], [62, 67]], 40, rng=np.random.default_rng(0))
+
+	assert songs.shape == (3, 42)
+	np.testing.assert_array_equal(songs[:, :2], [[60, 62], [64, 60], [62, 67]])
+	generatedWindows = set(tuple(window) for song in songs.tolist() for window in zip(song, song[1:], song[2:]))
+	assert generatedWindows <= sourceWindows
+	# both ways out of (60, 62) get taken somewhere in 120 draws
+	assert (60, 62, 64) in generatedWindows and (60, 62, 67) in generatedWindows
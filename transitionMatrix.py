@@ -1,79 +1,415 @@
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import scipy.sparse
+import scipy.sparse.csgraph
+import scipy.sparse.linalg
 
-def generateTransitionMatrix(bigramList):
+import batchGeneration
+
+'''
+First order Markov models of note sequences. A transition matrix is numNotes x numNotes,
+column i is the distribution of the note that comes after note i (so the i, jth count is
+how often note j was followed by note i, and every column sums to 1).
+
+The notes get their columns from a fixed index (the sorted notes, or any sorted array of
+notes you give, ex: np.arange(128) so models of different pieces line up), and all the
+transitions are counted in one bincount instead of growing the matrix one note at a time.
+Notes that are never followed by anything get a column of zeros.
+
+Higher order models (the next note depends on the last 2 or 3) only keep the contexts
+that actually happen, as rows of a sparse csr matrix (see buildHigherOrderModel), so they
+stay small instead of growing as numNotes ** order.
+'''
+
+def transitionCounts(currentIds, nextIds, counts, numNotes, sparse=False):
+	'''
+	numNotes x numNotes matrix of how often each note (column) was followed by each note (row)
+
+	Inputs
+	currentIds, nextIds: column index of the first and second note of every transition
+	counts: how many times each transition happened
+	sparse: give a scipy.sparse csc matrix instead of a dense array
+	'''
+	if sparse:
+		# duplicate transitions get added up when converting
+		return scipy.sparse.coo_matrix((np.asarray(counts, dtype=np.float64), (nextIds, currentIds)),
+									   shape=(numNotes, numNotes)).tocsc()
+	flatCounts = np.bincount(nextIds * numNotes + currentIds, weights=counts, minlength=numNotes * numNotes)
+	return flatCounts.reshape(numNotes, numNotes)
+
+def normalizeColumns(counts):
+	'''
+	Scale every column of a count matrix (dense or scipy.sparse) to sum to 1. Columns of
+	all zeros stay all zeros instead of turning into nan.
+	'''
+	totals = np.asarray(counts.sum(axis=0), dtype=np.float64).ravel()
+	scale = np.zeros(len(totals))
+	scale[totals > 0] = 1.0 / totals[totals > 0]
+	if scipy.sparse.issparse(counts):
+		return scipy.sparse.csc_matrix(counts @ scipy.sparse.diags(scale))
+	return counts * scale
+
+def noteIndex(notes, index=None):
+	'''
+	Column of every note in the index (sorted notes), defaults to the notes themselves
+	'''
+	if index is None:
+		index = np.unique(notes)
+	ids = np.searchsorted(index, notes)
+	if np.any(ids >= len(index)) or np.any(index[np.minimum(ids, len(index) - 1)] != notes):
+		raise ValueError('some notes are missing from the note index')
+	return ids, index
+
+def buildTransitionMatrix(sequence, index=None, sparse=False):
+	'''
+	Transition matrix of a sequence of notes
+
+	Inputs
+	sequence: 1-d array of notes
+	index: sorted notes to give the columns to, defaults to the notes in the sequence
+	sparse: give a scipy.sparse csc matrix instead of a dense array
+
+	Output:
+	transitionMatrix: numNotes x numNotes, column i is the distribution of the note after index[i]
+	index: the note of every column
+	'''
+	ids, index = noteIndex(np.asarray(sequence), index)
+	counts = transitionCounts(ids[:-1], ids[1:], np.ones(max(len(ids) - 1, 0)), len(index), sparse)
+	return normalizeColumns(counts), index
+
+def generateTransitionMatrix(bigramList, index=None, sparse=False):
 	'''
 	Generate a transition matrix from a bigram list
-	The i, jth location in the matrix represents the frequency of the ith note being
-	followed by the jth note.
+	The i, jth location in the matrix represents the frequency of the jth note being
+	followed by the ith note, each column sums to 1.
 
 	The function will return a dictionary of notes --> columns, so that you know which 
-	absolute note is the ith / jth note (maps note number to column in the array)
+	absolute note is the ith / jth note (maps note number to column in the array). The
+	columns go in sorted note order, or follow index (sorted notes) if you give one.
 
 	The function returns both the transition matrix, and the dictionary of notes to columns
 	'''
+	bigrams = np.array([bigram for bigram, freq in bigramList]).reshape(-1, 2)
+	freqs = np.array([freq for bigram, freq in bigramList], dtype=np.float64)
+	ids, index = noteIndex(bigrams.ravel(), index)
+	ids = ids.reshape(-1, 2)
 
-	# Initialize Variables
-	noteToColumnDict = {}
-	numNotesSeen = 0
-	transitionMatrix = np.empty((0,0))
-
-	# Loop through each bigram + frequency tuple
-	for bigramTuple in bigramList:
-		# accumulate a matrix of the occurence of each note after each other note
-		# grab the information from your current bigram tuple, which has the bigram and its frequency
-		(noteOne, noteTwo) = bigramTuple[0]
-		freq = bigramTuple[1]
-
-		# if you haven't seen the note before give it a row and column in the matrix
-		if noteOne not in noteToColumnDict:
-			noteToColumnDict[noteOne] = numNotesSeen
-			numNotesSeen = numNotesSeen + 1
-			transitionMatrix = np.lib.pad(transitionMatrix, (0,1), 'constant', constant_values=(1,0))
-		if noteTwo not in noteToColumnDict:
-			noteToColumnDict[noteTwo] = numNotesSeen
-			numNotesSeen = numNotesSeen + 1
-			transitionMatrix = np.lib.pad(transitionMatrix, (0,1), 'constant', constant_values=(1,0))
-
-		# set the current spot in the transition matrix to the observed frequency
-		transitionMatrix[noteToColumnDict[noteTwo], noteToColumnDict[noteOne]] = freq
-
-	# normalize the matrix so that each column sums to 1 (each represents frequency instead of absolute amounts)
-	transitionMatrix = transitionMatrix / np.sum(transitionMatrix, 0)
+	transitionMatrix = normalizeColumns(transitionCounts(ids[:, 0], ids[:, 1], freqs, len(index), sparse))
+	noteToColumnDict = dict((note, column) for column, note in enumerate(index.tolist()))
 	return transitionMatrix, noteToColumnDict
 
 
-def getSteadyStateDistribution(matrix, initialCondition):
-	largeNum = 2000
-	return np.linalg.matrix_power(matrix, largeNum).dot(initialCondition)
+def deadEndColumns(matrix):
+	'''
+	Boolean array, the columns of a transition matrix that sum to 0 (notes never followed by anything)
+	'''
+	return np.asarray(matrix.sum(axis=0)).ravel() <= 0
+
+def usedNotes(matrix):
+	'''
+	Boolean array, the notes (columns) that show up in the transition matrix at all
+	'''
+	return (np.asarray(abs(matrix).sum(axis=0)).ravel() > 0) | (np.asarray(abs(matrix).sum(axis=1)).ravel() > 0)
+
+def chainStructure(matrix):
+	'''
+	Split the chain of a transition matrix (dense or scipy.sparse) into its communicating
+	classes (notes that can all reach each other)
+
+	Output: dict with
+	'labels': the class of every note
+	'closed': for every class, whether the chain can never leave it once it's in it
+	'periods': for every class, the gcd of the lengths of all the ways back to the same
+			   note (1 means aperiodic, 0 for a note that can't get back to itself)
+	'irreducible': whether every note can reach every other one
+	'''
+	# note i -> note j is an edge when column i gives j a chance
+	edges = scipy.sparse.csr_matrix(matrix).T.tocsr()
+	edges.eliminate_zeros()
+	numClasses, labels = scipy.sparse.csgraph.connected_components(edges, directed=True, connection='strong')
+	sources, targets = edges.nonzero()
+
+	leaving = np.zeros(numClasses, dtype=bool)
+	leaving[labels[sources[labels[sources] != labels[targets]]]] = True
+	periods = np.zeros(numClasses, dtype=np.int64)
+	for c in range(numClasses):
+		members = np.flatnonzero(labels == c)
+		inside = (labels[sources] == c) & (labels[targets] == c)
+		if not np.any(inside):
+			continue
+		# with d the distance from one note of the class, the period is the gcd of d(u) + 1 - d(v) over the edges u -> v
+		distance = scipy.sparse.csgraph.shortest_path(edges, unweighted=True, indices=members[0])
+		periods[c] = np.gcd.reduce(np.abs(distance[sources[inside]] + 1 - distance[targets[inside]]).astype(np.int64))
+	return {'labels': labels, 'closed': ~leaving, 'periods': periods, 'irreducible': numClasses == 1}
+
+def getSteadyStateDistribution(matrix, initialCondition=None, tolerance=1e-12, maxIterations=100000, method='power'):
+	'''
+	The distribution the chain settles into starting from initialCondition
+
+	Power iteration steps the distribution with the lazy chain (half the time staying put),
+	which has the same steady state but doesn't oscillate on periodic chains, until it moves
+	less than tolerance. Anything that reaches a note that's never followed by anything
+	starts over from initialCondition, so no probability leaks out.
+	method='eigen' takes the leading eigenvector instead, which for a reducible chain
+	is a steady state of one of its closed classes (see chainStructure).
+
+	Inputs
+	matrix: numNotes x numNotes transition matrix, dense or scipy.sparse
+	initialCondition: starting distribution, defaults to uniform over the notes in the matrix
+	tolerance: stop once the distribution changes less than this (sum of absolute changes)
+	maxIterations: give up after this many steps
+	method: 'power' or 'eigen'
+
+	Output:
+	steady state distribution over the notes (columns)
+	'''
+	numNotes = matrix.shape[0]
+	if initialCondition is None:
+		initialCondition = usedNotes(matrix).astype(np.float64)
+	initialCondition = np.asarray(initialCondition, dtype=np.float64)
+	initialCondition = initialCondition / initialCondition.sum()
+	deadEnds = deadEndColumns(matrix)
+
+	if method == 'eigen':
+		# dead ends restart from the initial condition, then the lazy chain makes 1 the only eigenvalue on the unit circle
+		if scipy.sparse.issparse(matrix) and numNotes > 2:
+			# the restarts are rank one, so the lazy chain is only ever applied to vectors and stays sparse
+			def lazyStep(vector):
+				vector = np.ravel(vector)
+				return (matrix.dot(vector) + vector[deadEnds].sum() * initialCondition + vector) / 2
+			lazy = scipy.sparse.linalg.LinearOperator((numNotes, numNotes), matvec=lazyStep, dtype=np.float64)
+			values, vectors = scipy.sparse.linalg.eigs(lazy, k=1, which='LM')
+		else:
+			# dense matrices, and chains too small for eigs (it needs at least 3 notes)
+			dense = matrix.toarray() if scipy.sparse.issparse(matrix) else np.asarray(matrix, dtype=np.float64)
+			values, vectors = np.linalg.eig((dense + np.outer(initialCondition, deadEnds) + np.identity(numNotes)) / 2)
+		vector = np.abs(np.real(vectors[:, np.argmax(np.real(values))]))
+		return vector / vector.sum()
+	if method != 'power':
+		raise ValueError("method has to be 'power' or 'eigen', not %r"%(method))
+
+	distribution = initialCondition
+	for iteration in range(maxIterations):
+		stepped = matrix.dot(distribution) + distribution[deadEnds].sum() * initialCondition
+		newDistribution = (distribution + stepped) / 2
+		if np.abs(newDistribution - distribution).sum() < tolerance:
+			return newDistribution
+		distribution = newDistribution
+	print('Steady state did not converge to %g in %d iterations'%(tolerance, maxIterations))
+	return distribution
 
+def getSteadyStateDistributions(matrices, initialConditions=None, tolerance=1e-12, maxIterations=100000):
+	'''
+	Batched getSteadyStateDistribution (power iteration) for models over the same notes,
+	ex: one 128 x 128 matrix per piece built with index=np.arange(128)
+
+	Inputs
+	matrices: numModels x numNotes x numNotes stack of transition matrices
+	initialConditions: numModels x numNotes starting distributions, defaults to uniform over the notes in each model
+
+	Output:
+	numModels x numNotes array, the steady state of every model
+	'''
+	matrices = np.asarray(matrices, dtype=np.float64)
+	deadEnds = matrices.sum(axis=1) <= 0
+	if initialConditions is None:
+		initialConditions = ((matrices.sum(axis=1) > 0) | (matrices.sum(axis=2) > 0)).astype(np.float64)
+	initialConditions = np.asarray(initialConditions, dtype=np.float64)
+	initialConditions = initialConditions / initialConditions.sum(axis=1, keepdims=True)
+
+	distributions = initialConditions
+	for iteration in range(maxIterations):
+		stepped = np.matmul(matrices, distributions[:, :, None])[:, :, 0]
+		stepped = stepped + np.sum(distributions * deadEnds, axis=1, keepdims=True) * initialConditions
+		newDistributions = (distributions + stepped) / 2
+		if np.max(np.abs(newDistributions - distributions).sum(axis=1)) < tolerance:
+			return newDistributions
+		distributions = newDistributions
+	print('Steady states did not converge to %g in %d iterations'%(tolerance, maxIterations))
+	return distributions
 
 def colToNote(col, noteToColumnDict):
-	keys = [key for key, value in noteToColumnDict.iteritems() if value == col]
+	keys = [key for key, value in noteToColumnDict.items() if value == col]
 	# should just be one element
 	return keys[0]
 
-def generateSequenceFromTransitionMatrix(transitionMatrix, noteToColumnDict, initialCondition, seqLength):
-	seq = []
-	numNotes = transitionMatrix.shape[0] # equal to the number of rows or columns
-	curDistribution = initialCondition
+def generateSequenceFromTransitionMatrix(transitionMatrix, noteToColumnDict, initialCondition, seqLength, rng=None):
+	'''
+	Generate a sequence of seqLength notes by walking the chain: the first note is drawn from
+	initialCondition, every note after that from the column of the note before it
+
+	Every column's distribution is turned into running sums once up front, so a step is
+	one binary search in its column, and columns map back to notes through an array
+	(see batchGeneration.walkColumns and batchGeneration.columnNotes).
+
+	Inputs
+	transitionMatrix: numNotes x numNotes, dense or scipy.sparse, column i is the distribution of the note after note i
+	noteToColumnDict: maps note -> column (what generateTransitionMatrix gives)
+	initialCondition: distribution of the first note over the columns
+	seqLength: number of notes to generate
+	rng: numpy random Generator, defaults to a fresh one
+
+	Output:
+	array of seqLength notes, ready for oneDimArrayToMidi
+	'''
+	if rng is None:
+		rng = np.random.default_rng()
+	notes = batchGeneration.columnNotes(noteToColumnDict)
+	if seqLength <= 0:
+		return notes[:0]
+	initialCondition = np.asarray(initialCondition, dtype=np.float64)
+	uniforms = rng.random(seqLength)
+	# the first note is an inverse-CDF draw from the initial condition too
+	initialCdf = np.cumsum(initialCondition) / initialCondition.sum()
+	startColumn = min(np.searchsorted(initialCdf, uniforms[0], side='right'), len(notes) - 1)
+	columns = batchGeneration.walkColumns(transitionMatrix, np.array([startColumn]), uniforms[None, 1:])
+	return notes[columns[0]]
+
+def contextWindows(sequences, order, index=None):
+	'''
+	Every window of order + 1 notes of one or more sequences (windows don't cross from one
+	sequence into the next) as column ids
+
+	Output:
+	windows: numWindows x (order + 1) array of column ids, plus the last order notes of every sequence padded with -1
+	index: the note of every column
+	'''
+	if isinstance(sequences, np.ndarray) and sequences.ndim == 1:
+		sequences = [sequences]
+	sequences = [np.asarray(sequence) for sequence in sequences]
+	if index is None:
+		index = np.unique(np.concatenate(sequences))
+	windows = []
+	for sequence in sequences:
+		if len(sequence) < order:
+			continue
+		# the -1 on the end makes the final context of the sequence a window too, with nothing after it
+		ids = np.append(noteIndex(sequence, index)[0], -1)
+		windows.append(sliding_window_view(ids, order + 1))
+	if not windows:
+		return np.zeros((0, order + 1), dtype=np.int64), index
+	return np.concatenate(windows), index
+
+def buildHigherOrderModel(sequences, order, index=None):
+	'''
+	Markov model where the next note depends on the last order notes, kept sparse: only the
+	contexts (runs of order notes) that actually happen get a row
+
+	Inputs
+	sequences: 1-d array of notes, or a list of them (ex: every piece of a corpus)
+	order: how many notes of context, 2 or 3 (1 is an ordinary transition matrix, transposed)
+	index: sorted notes to give the columns to, defaults to every note in the sequences
+
+	Output: dict with
+	'order': the order
+	'index': the note of every column
+	'contextIds': sorted flattened id of every context (its column ids as digits in base len(index))
+	'transitions': scipy.sparse csr matrix, numContexts x numNotes, row c is the distribution of the
+				   note after context contextIds[c] (all zeros for a context never followed by anything)
+	'''
+	windows, index = contextWindows(sequences, order, index)
+	numNotes = len(index)
+	if numNotes ** order > np.iinfo(np.int64).max:
+		raise ValueError('%d notes of order %d is too many contexts to number'%(numNotes, order))
+	contextIds = np.zeros(len(windows), dtype=np.int64)
+	for i in range(order):
+		contextIds = contextIds * numNotes + windows[:, i]
 
-	# create samples for your sequence by randomly picking out of your current distribution
-	# then updating the distribution with the transition matrix
-	for i in range(seqLength):
-		# sample the column number, then convert it to a note
-		choice = np.random.choice(range(numNotes), p=curDistribution)
-		print(choice)
-		seq = seq + [colToNote(choice, noteToColumnDict)]
-		# update distribution
-		curDistribution = transitionMatrix.dot(curDistribution)
+	contextIds, rows = np.unique(contextIds, return_inverse=True)
+	followed = windows[:, order] >= 0
+	# duplicate transitions get added up when converting
+	counts = scipy.sparse.coo_matrix((np.ones(np.count_nonzero(followed)), (rows.ravel()[followed], windows[followed, order])),
+									 shape=(len(contextIds), numNotes)).tocsr()
+	transitions = scipy.sparse.csr_matrix(normalizeColumns(counts.T.tocsc()).T)
+	return {'order': order, 'index': index, 'contextIds': contextIds, 'transitions': transitions}
+
+def contextRows(model, contextIds):
+	'''
+	Row of every flattened context id in the model, -1 for contexts it never saw
+	'''
+	rows = np.searchsorted(model['contextIds'], contextIds)
+	seen = rows < len(model['contextIds'])
+	seen[seen] = model['contextIds'][rows[seen]] == contextIds[seen]
+	return np.where(seen, rows, -1)
+
+def nextContextIds(model, contextIds, nextColumns):
+	'''
+	Flattened id of the context you get by adding a note to the end of a context
+	'''
+	numNotes = len(model['index'])
+	return (contextIds % numNotes ** (model['order'] - 1)) * numNotes + nextColumns
+
+def contextTransitionMatrix(model):
+	'''
+	The higher order model as an ordinary (first order) chain over its contexts: a sparse
+	numContexts x numContexts matrix where column c is the distribution of the context after context c
+	'''
+	transitions = model['transitions'].tocoo()
+	targets = contextRows(model, nextContextIds(model, model['contextIds'][transitions.row], transitions.col))
+	# every context that follows another one is a window of the sequences, so it has a row
+	numContexts = len(model['contextIds'])
+	return scipy.sparse.csc_matrix((transitions.data, (targets, transitions.row)), shape=(numContexts, numContexts))
+
+def getHigherOrderSteadyState(model, tolerance=1e-12, maxIterations=100000):
+	'''
+	Steady state of a higher order model (see getSteadyStateDistribution, run on contextTransitionMatrix)
+
+	Output:
+	noteDistribution: how often each note (column) gets played in the long run
+	contextDistribution: steady state over the model's contexts
+	'''
+	contextDistribution = getSteadyStateDistribution(contextTransitionMatrix(model), tolerance=tolerance, maxIterations=maxIterations)
+	# the note being played is the last note of the context
+	lastNotes = model['contextIds'] % len(model['index'])
+	return np.bincount(lastNotes, weights=contextDistribution, minlength=len(model['index'])), contextDistribution
+
+def generateHigherOrderBatch(model, seeds, numSteps, rng=None, sequenceSeeds=None):
+	'''
+	Generate many sequences from a higher order model in lockstep (see batchGeneration.py).
+	A sequence that gets to a context with nothing after it starts over from its seed.
+
+	Inputs
+	seeds: numSequences x order array of starting notes, a context the model has seen
+	numSteps: how many notes to draw after each seed
+	rng: numpy random Generator, defaults to a fresh one
+	sequenceSeeds: optional random seed for every sequence (see batchGeneration.uniformMatrix)
+
+	Output:
+	numSequences x (order + numSteps) array of notes
+	'''
+	order = model['order']
+	numNotes = len(model['index'])
+	seeds = np.asarray(seeds).reshape(-1, order)
+	seedColumns = noteIndex(seeds.ravel(), model['index'])[0].reshape(-1, order)
+	seedIds = np.zeros(len(seeds), dtype=np.int64)
+	for i in range(order):
+		seedIds = seedIds * numNotes + seedColumns[:, i]
+	seedRows = contextRows(model, seedIds)
+	if np.any(seedRows < 0):
+		raise ValueError('some seeds are contexts the model never saw')
+	uniforms = batchGeneration.uniformMatrix(len(seeds), numSteps, rng, sequenceSeeds)
 
-	# map from column numbers back to notes
-	return seq
+	# rows of the model are the columns of its transpose, so every context's distribution is one column of running sums
+	flatCdf, nextColumns, contextStarts = batchGeneration.transitionCdf(model['transitions'].T)
+	deadEnds = contextStarts[1:] == contextStarts[:-1]
+	columns = np.zeros((len(seeds), order + numSteps), dtype=np.int64)
+	columns[:, :order] = seedColumns
+	current, currentIds = seedRows, seedIds
+	for step in range(numSteps):
+		restart = deadEnds[current]
+		current = np.where(restart, seedRows, current)
+		currentIds = np.where(restart, seedIds, currentIds)
+		drawn = np.minimum(np.searchsorted(flatCdf, current + uniforms[:, step], side='right'), contextStarts[current + 1] - 1)
+		columns[:, order + step] = nextColumns[drawn]
+		currentIds = nextContextIds(model, currentIds, columns[:, order + step])
+		current = contextRows(model, currentIds)
+	return model['index'][columns]
 
-# test
-bigramList = [((0,1), 3), ((0,2), 4), ((0,3), 2), ((1,2), 2), ((1,3), 4), ((2,3), 2), ((2,2), 1), ((3,0), 1)]
-matrix, noteToCol = generateTransitionMatrix(bigramList)
+if __name__ == '__main__':
+	# test
+	bigramList = [((0,1), 3), ((0,2), 4), ((0,3), 2), ((1,2), 2), ((1,3), 4), ((2,3), 2), ((2,2), 1), ((3,0), 1)]
+	matrix, noteToCol = generateTransitionMatrix(bigramList)
 
-steadyState = getSteadyStateDistribution(matrix, np.array([1,0,0,0]))
+	steadyState = getSteadyStateDistribution(matrix, np.array([1,0,0,0]))
 
-seq = generateSequenceFromTransitionMatrix(matrix, noteToCol, np.array([1,0,0,0]), 100)
+	seq = generateSequenceFromTransitionMatrix(matrix, noteToCol, np.array([1,0,0,0]), 100)
@@ -0,0 +1,71 @@
+import numpy as np
+import scipy.sparse
+
+'''
+Pick one voice (one pitch per frame) out of a piano roll, without looping over the
+cells in python. Used to get the melody for the n-grams (ngrams.py) and to find the
+frames that have notes in them for the alignment (makeCost.py, DTW_And_Reconstruction.py).
+
+Voices:
+'top': the highest pitch on in each frame (the skyline, what generateOneDimArray gave)
+'bass': the lowest pitch on in each frame
+'nth': the nth highest pitch on in each frame, counting from 0 (so n=0 is the top voice)
+'''
+
+def onFrames(logicalMat):
+	'''
+	Dense boolean version of a num_notes x timeChunks matrix (dense or scipy.sparse), True where a note is on
+	'''
+	if scipy.sparse.issparse(logicalMat):
+		return logicalMat.toarray() != 0
+	return np.asarray(logicalMat) != 0
+
+def voicePitches(logicalMat, voice='top', n=0):
+	'''
+	The pitch of one voice in every frame of a num_notes x timeChunks matrix
+
+	Output:
+	pitches: the pitch of the voice in each frame (garbage where the frame has no such voice)
+	hasVoice: boolean array, whether each frame has that voice at all
+	'''
+	on = onFrames(logicalMat)
+	numPitches = on.shape[0]
+	if voice == 'bass':
+		# argmax finds the first True, which going up from pitch 0 is the lowest note
+		return np.argmax(on, axis=0), np.any(on, axis=0)
+	if voice == 'top':
+		n = 0
+	elif voice != 'nth':
+		raise ValueError("voice has to be 'top', 'bass' or 'nth', not %r"%(voice))
+
+	if n == 0:
+		# argmax over the reversed pitch axis finds the highest note
+		return numPitches - 1 - np.argmax(on[::-1], axis=0), np.any(on, axis=0)
+	# number of notes on at or above each pitch, the nth voice is where that first goes past n
+	notesFromTop = np.cumsum(on[::-1], axis=0)
+	return numPitches - 1 - np.argmax(notesFromTop > n, axis=0), notesFromTop[-1] > n
+
+def extractVoice(logicalMat, voice='top', n=0):
+	'''
+	One voice of a num_notes x timeChunks matrix, keeping only the frames that have it
+
+	Inputs
+	logicalMat: num_notes x timeChunks matrix, dense or scipy.sparse. Anything non zero counts as on.
+	voice: 'top', 'bass' or 'nth'
+	n: which voice for 'nth', counting from the top (0 is the top voice)
+
+	Output:
+	melody: int array, the pitch of the voice in each frame that has it
+	frames: int array, the frame (column of logicalMat) each pitch of the melody comes from
+	'''
+	pitches, hasVoice = voicePitches(logicalMat, voice, n)
+	frames = np.flatnonzero(hasVoice)
+	return pitches[frames].astype(np.int64), frames
+
+def voiceArray(logicalMat, voice='top', n=0, fill=0):
+	'''
+	One voice of a num_notes x timeChunks matrix as one pitch per frame, fill where the
+	frame doesn't have that voice (with voice='top' this is what generateOneDimArray gave)
+	'''
+	pitches, hasVoice = voicePitches(logicalMat, voice, n)
+	return np.where(hasVoice, pitches, fill)